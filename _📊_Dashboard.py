@@ -2,6 +2,7 @@ import streamlit as st
 import pandas as pd
 import time
 from datetime import datetime, date
+import extra_streamlit_components as stx
 import utils_db
 
 # ============================================================================
@@ -26,6 +27,10 @@ if 'usuario_atual' not in st.session_state: st.session_state['usuario_atual'] =
 # ============================================================================
 # 2. LOGIN
 # ============================================================================
+# Cookie de sessão assinado: recarregar a página não pede login de novo
+cookies = stx.CookieManager(key="cookies")
+if not st.session_state['logado'] and not st.session_state.get('saiu'): utils_db.restaurar_sessao(cookies)
+
 if not st.session_state['logado']:
     col1, col2, col3 = st.columns([1,1,1])
     with col2:
@@ -37,7 +42,14 @@ if not st.session_state['logado']:
                 if hasattr(utils_db, 'verificar_login_db') and utils_db.verificar_login_db(usuario, senha):
                     st.session_state['logado'] = True
                     st.session_state['usuario_atual'] = usuario
+                    st.session_state['saiu'] = False
+                    token, expira_em = utils_db.criar_token_sessao(usuario)
+                    if token:
+                        cookies.set(utils_db.COOKIE_SESSAO, token, expires_at=expira_em, key="set_sessao")
+                        time.sleep(0.5)   # dá tempo do navegador gravar o cookie antes do rerun
                     st.rerun()
+                elif utils_db.login_bloqueado(usuario):
+                    st.error(f"Muitas tentativas. Tente novamente em {utils_db.login_bloqueado(usuario)} s.")
                 else:
                     st.error("Usuário ou Senha incorretos.")
     st.stop()
@@ -55,6 +67,13 @@ def formatar_data_br(valor):
 c1, c2 = st.columns([4, 1])
 c1.title("Painel de projetos SIARCON")
 c2.info(f"👤 {st.session_state['usuario_atual']}")
+if c2.button("🚪 Sair", use_container_width=True):
+    try: cookies.delete(utils_db.COOKIE_SESSAO, key="del_sessao")
+    except: pass
+    st.session_state['logado'] = False
+    st.session_state['usuario_atual'] = ""
+    st.session_state['saiu'] = True   # o cookie apagado ainda pode vir no próximo rerun
+    time.sleep(0.5); st.rerun()
 
 with st.expander("➕ Cadastrar Nova Obra / Projetos", expanded=False):
     with st.form("cad_proj", clear_on_submit=True):
@@ -69,14 +88,15 @@ with st.expander("➕ Cadastrar Nova Obra / Projetos", expanded=False):
         if st.form_submit_button("🚀 Criar Etiquetas"):
             if cli and obr and disciplinas_selecionadas:
                 data_hoje = datetime.now().strftime("%Y-%m-%d")
-                for disc in disciplinas_selecionadas:
-                    novo_projeto = {
-                        "cliente": cli, "obra": obr, "disciplina": disc, 
-                        "status": "Não Iniciado", "prazo": data_hoje,
-                        "criado_por": st.session_state['usuario_atual']
-                    }
-                    utils_db.salvar_projeto(novo_projeto)
-                st.success(f"{len(disciplinas_selecionadas)} etiquetas criadas!"); time.sleep(1); st.rerun()
+                novos_projetos = [{
+                    "cliente": cli, "obra": obr, "disciplina": disc, 
+                    "status": "Não Iniciado", "prazo": data_hoje,
+                    "criado_por": st.session_state['usuario_atual']
+                } for disc in disciplinas_selecionadas]
+                # Uma escrita só para todas as disciplinas
+                if utils_db.registrar_projetos_em_lote(novos_projetos):
+                    st.success(f"{len(disciplinas_selecionadas)} etiquetas criadas!"); time.sleep(1); st.rerun()
+                else: st.error("Erro ao criar etiquetas! Verifique a conexão.")
             else: st.error("Preencha todos os campos.")
 
 st.divider()
@@ -91,14 +111,46 @@ except:
 
 # Colunas Oficiais do Kanban
 status_cols = ["Não Iniciado", "Engenharia", "Obras", "Suprimentos", "Finalizado"]
-colunas_tela = st.columns(len(status_cols))
 cores = {"Não Iniciado": "🔴", "Engenharia": "🔵", "Obras": "🏗️", "Suprimentos": "📦", "Finalizado": "🟢"}
 
+# Quadro leve: filtros antes de renderizar, N cards mais recentes por coluna
+# ("mostrar mais" sob demanda) e Finalizado recolhido por padrão
+CARDS_POR_PAGINA = 20
+
+# Modo lote: marca vários cards e move todos com uma escrita só
+if 'selecionados' not in st.session_state: st.session_state['selecionados'] = set()
+
+def alternar_selecao(uid):
+    if st.session_state.get(f"S_{uid}"): st.session_state['selecionados'].add(uid)
+    else: st.session_state['selecionados'].discard(uid)
+
+def marcar_obra(ids):
+    st.session_state['selecionados'].update(ids)
+    for u in ids: st.session_state.pop(f"S_{u}", None)
+
+def limpar_selecao():
+    for u in st.session_state['selecionados']: st.session_state.pop(f"S_{u}", None)
+    st.session_state['selecionados'] = set()
+
+def mostrar_mais(s_nome):
+    st.session_state[f"lim_{s_nome}"] = st.session_state.get(f"lim_{s_nome}", CARDS_POR_PAGINA) + CARDS_POR_PAGINA
+
+with st.expander("🔎 Filtros", expanded=False):
+    f1, f2, f3, f4 = st.columns(4)
+    f_cli = f1.multiselect("Cliente", sorted(df['cliente'].astype(str).unique()) if 'cliente' in df.columns else [])
+    f_obra = f2.text_input("Obra contém")
+    f_disc = f3.multiselect("Disciplina", ["Dutos", "Hidráulica", "Elétrica", "Automação", "TAB", "Movimentações", "Cobre"])
+    f_prazo = f4.date_input("Prazo entre", value=(), format="DD/MM/YYYY")
+
+modo_lote = st.toggle("☑️ Mover vários cards", key="modo_lote")
+barra_lote = st.container()
+colunas_tela = st.columns(len(status_cols))
+
 if df.empty:
     st.info("Nenhum projeto encontrado.")
 else:
     # Garante colunas
-    for c in ['status', 'obra', 'cliente', 'disciplina']:
+    for c in ['_id', 'status', 'obra', 'cliente', 'disciplina', 'prazo']:
         if c not in df.columns: df[c] = ""
     
     # Limpeza básica
@@ -119,16 +171,30 @@ else:
     # Rede de Segurança Final: Se ainda assim não bater com as colunas, joga para "Não Iniciado"
     df.loc[~df['status'].isin(status_cols), 'status'] = "Não Iniciado"
 
+    # --- FILTROS ---
+    if f_cli: df = df[df['cliente'].astype(str).isin(f_cli)]
+    if f_obra: df = df[df['obra'].astype(str).str.contains(f_obra, case=False, regex=False)]
+    if f_disc: df = df[df['disciplina'].astype(str).isin(f_disc)]
+    if len(f_prazo) == 2:
+        prazos = pd.to_datetime(df['prazo'].astype(str), format="%Y-%m-%d", errors='coerce').dt.date
+        df = df[(prazos >= f_prazo[0]) & (prazos <= f_prazo[1])]
+    
+    # Mais recentes primeiro (o _id é o timestamp de criação)
+    df = df.sort_values('_id', ascending=False, kind='stable', key=lambda s: s.astype(str))
+
     # Renderiza as Colunas
     for i, s_nome in enumerate(status_cols):
         with colunas_tela[i]:
-            st.markdown(f"**{cores.get(s_nome,'')} {s_nome}**")
-            st.divider()
-            
             # Filtra
             df_s = df[df['status'] == s_nome]
+            st.markdown(f"**{cores.get(s_nome,'')} {s_nome}** ({len(df_s)})")
+            if s_nome == "Finalizado" and not st.toggle("Mostrar", key="ver_finalizados", value=False):
+                st.caption(f"{len(df_s)} card(s) recolhido(s).")
+                continue
+            st.divider()
             
-            for idx, row in df_s.iterrows():
+            limite = st.session_state.get(f"lim_{s_nome}", CARDS_POR_PAGINA)
+            for idx, row in df_s.head(limite).iterrows():
                 with st.container(border=True):
                     uid = row.get('_id', idx)
                     tit = row.get('obra', 'Sem Nome')
@@ -136,6 +202,9 @@ else:
                     disc_txt = row.get('disciplina', '')
                     data_txt = formatar_data_br(row.get('prazo', '-'))
                     
+                    if modo_lote:
+                        st.checkbox("Selecionar", key=f"S_{uid}", value=uid in st.session_state['selecionados'],
+                                    on_change=alternar_selecao, args=(uid,))
                     st.markdown(f"**{tit}**")
                     st.caption(f"{cli_txt}")
                     st.caption(f"{disc_txt} | 📅 {data_txt}")
@@ -148,9 +217,7 @@ else:
                     # Mover Esquerda
                     if i > 0:
                         if b1.button("⬅️", key=f"L_{uid}"):
-                            row_dict = row.to_dict()
-                            row_dict['status'] = status_cols[i-1]
-                            utils_db.salvar_projeto(row_dict)
+                            utils_db.mover_status([uid], status_cols[i-1])
                             st.rerun()
                     
                     # Abrir
@@ -177,12 +244,38 @@ else:
                     # Mover Direita
                     if i < len(status_cols)-1:
                         if b4.button("➡️", key=f"R_{uid}"):
-                            row_dict = row.to_dict()
-                            row_dict['status'] = status_cols[i+1]
-                            utils_db.salvar_projeto(row_dict)
+                            utils_db.mover_status([uid], status_cols[i+1])
                             st.rerun()
+            
+            # Paginação
+            restantes = len(df_s) - limite
+            if restantes > 0:
+                st.button(f"⬇️ Mostrar mais ({restantes})", key=f"mais_{s_nome}", use_container_width=True,
+                          on_click=mostrar_mais, args=(s_nome,))
+
+    # Barra do modo lote (fica acima do quadro)
+    if modo_lote:
+        sel = [u for u in df['_id'] if u in st.session_state['selecionados']]
+        with barra_lote:
+            l1, l2, l3, l4, l5 = st.columns([2, 1, 1, 2, 1])
+            obra_sel = l1.selectbox("Obra", sorted(df['obra'].astype(str).unique()), key="obra_lote")
+            l2.button("Marcar obra", use_container_width=True, on_click=marcar_obra,
+                      args=(list(df.loc[df['obra'].astype(str) == obra_sel, '_id']),))
+            l3.caption(f"{len(sel)} selecionado(s)")
+            l3.button("Limpar", on_click=limpar_selecao)
+            destino = l4.selectbox("Mover para", status_cols, key="destino_lote")
+            if l5.button("🚚 Mover", disabled=not sel, use_container_width=True):
+                n = utils_db.mover_status(sel, destino)
+                if n == 0:
+                    st.error("Nenhum card foi movido. Verifique a conexão e tente novamente.")
+                else:
+                    limpar_selecao()
+                    st.success(f"{n} card(s) movido(s) para {destino}."); time.sleep(1); st.rerun()
 
 st.divider()
+pendentes = utils_db.sincronizacao_pendente()
+if pendentes: st.caption(f"⏳ {pendentes} alteração(ões) aguardando envio ao Google Sheets.")
 if st.button("🔄 Atualizar Quadro"):
     st.cache_data.clear()
+    utils_db.invalidar_aba()
     st.rerun()
@@ -0,0 +1,184 @@
+"""
+Benchmark do motor DXF (utils_dxf) com desenhos sintéticos.
+
+Gera um DXF com trechos de duto (duas paredes paralelas + rótulo "LxA (vazão)"),
+linhas de ruído e vários layers de parede, roda cada etapa do leitor e mostra
+tempo, pico de memória e o comprimento medido contra o esperado.
+
+Exemplos:
+    python benchmark_dxf.py
+    python benchmark_dxf.py --trechos 2000 --ruido 200000 --unidade m
+    python benchmark_dxf.py --trechos 5000 --processos 8 --json resultado.json
+"""
+import argparse
+import io
+import json
+import math
+import random
+
+import ezdxf
+import pandas as pd
+
+import utils_dxf
+
+LARGURAS = [200, 300, 400, 500, 600, 800, 1000, 1200, 1500]
+ALTURAS = [150, 200, 300, 400, 500, 600]
+
+# ============================================================================
+# 1. DESENHO SINTÉTICO
+# ============================================================================
+def gerar_dxf(n_trechos=500, rotulos_por_trecho=1, n_layers=1, n_ruido=5000,
+              frac_ruido_parede=0.2, unidade='mm', raio=None, seed=42):
+    """Retorna (bytes do DXF, {tag: comprimento esperado em m}, layers de parede, raio)."""
+    rnd = random.Random(seed)
+    k = 1.0 if unidade == 'mm' else 0.001   # mm de projeto -> unidade do desenho
+    raio = raio if raio is not None else 2000 * k
+
+    doc = ezdxf.new()
+    msp = doc.modelspace()
+    layers = [f"DUTO-{i+1}" for i in range(n_layers)]
+    for nome in layers + ["ARQ", "TEXTO"]: doc.layers.add(nome)
+
+    # Trechos em uma grade, afastados o bastante para o raio de um não pegar o vizinho
+    passo = 3 * 2000 + 8000
+    colunas = max(1, int(math.ceil(math.sqrt(n_trechos))))
+    esperado = {}
+    vazao = 1000
+    for i in range(n_trechos):
+        w, h = rnd.choice(LARGURAS), rnd.choice(ALTURAS)
+        comp = rnd.uniform(1500, 7000)
+        ang = rnd.choice([0, 90, rnd.uniform(0, 180)])
+        ox, oy = (i % colunas) * passo, (i // colunas) * passo
+        ux, uy = math.cos(math.radians(ang)), math.sin(math.radians(ang))
+        nx, ny = -uy, ux
+        layer = layers[i % n_layers]
+
+        # Paredes: 2 LINEs ou LWPOLYLINE em "U" começando junto ao rótulo
+        # (a largura é a distância entre as paredes)
+        p1 = (ox, oy); p2 = (ox + ux*comp, oy + uy*comp)
+        q1 = (ox + nx*w, oy + ny*w); q2 = (q1[0] + ux*comp, q1[1] + uy*comp)
+        if rnd.random() < 0.5:
+            msp.add_line(_esc(p1, k), _esc(p2, k), dxfattribs={'layer': layer})
+            msp.add_line(_esc(q1, k), _esc(q2, k), dxfattribs={'layer': layer})
+        else:
+            msp.add_lwpolyline([_esc(p1, k), _esc(p2, k), _esc(q2, k), _esc(q1, k)], dxfattribs={'layer': layer})
+
+        for _ in range(rotulos_por_trecho):
+            vazao += 1
+            tag = f"{w}x{h} ({vazao})"
+            d = rnd.uniform(0.05, 0.6) * 2000
+            pos = (ox + ux*d + nx*w/2, oy + uy*d + ny*w/2)
+            msp.add_text(tag, dxfattribs={'insert': _esc(pos, k), 'layer': 'TEXTO', 'height': 100*k})
+            esperado[tag.upper()] = comp / 1000   # o parser devolve a tag em maiúsculas
+
+    # Ruído: linhas soltas na arquitetura e, em parte, nos próprios layers de parede
+    largura_total = colunas * passo
+    for _ in range(n_ruido):
+        x, y = rnd.uniform(0, largura_total), rnd.uniform(0, largura_total)
+        dx, dy = rnd.uniform(-3000, 3000), rnd.uniform(-3000, 3000)
+        layer = rnd.choice(layers) if rnd.random() < frac_ruido_parede else "ARQ"
+        msp.add_line(_esc((x, y), k), _esc((x+dx, y+dy), k), dxfattribs={'layer': layer})
+
+    txt = io.StringIO()
+    doc.write(txt)
+    return txt.getvalue().encode(doc.output_encoding), esperado, layers, raio
+
+def _esc(p, k):
+    return (p[0]*k, p[1]*k)
+
+# ============================================================================
+# 2. MEDIÇÃO DAS ETAPAS
+# ============================================================================
+def medir_etapa(perfil, nome, fn):
+    with utils_dxf.etapa(perfil, nome):
+        return fn()
+
+def comparar_comprimentos(dutos, esperado, tol=0.05):
+    erros = []
+    acertos = medidos = 0
+    for d in dutos:
+        real = esperado.get(d['Tag'])
+        if real is None: continue
+        if d['Origem'].startswith("Medido"):
+            medidos += 1
+            erro = abs(d['Comp. (m)'] - real)
+            erros.append(erro)
+            if erro <= tol * real: acertos += 1
+    n = len(esperado)
+    return {
+        'rotulos': n, 'dutos_lidos': len(dutos), 'medidos': medidos,
+        'acerto_%': round(100 * acertos / n, 1) if n else 0.0,
+        'erro_medio_m': round(sum(erros) / len(erros), 3) if erros else None,
+    }
+
+def rodar(args):
+    perfil = utils_dxf.novo_perfil(medir_memoria=not args.sem_memoria)
+
+    dados, esperado, layers, raio = medir_etapa(perfil, "gerar", lambda: gerar_dxf(
+        args.trechos, args.rotulos, args.layers, args.ruido, args.ruido_parede,
+        args.unidade, args.raio, args.seed))
+    if args.salvar:
+        with open(args.salvar, 'wb') as f: f.write(dados)
+
+    textos, tab = medir_etapa(perfil, "leitura (stream)", lambda: utils_dxf.ler_dxf_stream(io.BytesIO(dados)))
+    if args.recover:
+        doc = medir_etapa(perfil, "leitura (recover)", lambda: utils_dxf.carregar_dxf_seguro(io.BytesIO(dados))[0])
+        msp = doc.modelspace()
+        medir_etapa(perfil, "textos (recover)", lambda: utils_dxf.extrair_todos_textos(msp.query('TEXT MTEXT INSERT')))
+        medir_etapa(perfil, "segmentos (recover)", lambda: utils_dxf.extrair_segmentos(msp.query('LINE LWPOLYLINE')))
+        del doc, msp
+
+    medir_etapa(perfil, "índice", lambda: utils_dxf.construir_indice(tab, layers, raio))
+    # processar registra as próprias etapas (parser, geometria) e os candidatos por tag
+    dutos, restos, logs = medir_etapa(perfil, "processar (total)", lambda: utils_dxf.processar(
+        textos, tab, layers, raio, args.comp_padrao, args.ignorar, True, args.processos, perfil))
+    medir_etapa(perfil, "memorial", lambda: utils_dxf.calcular_memorial(pd.DataFrame(dutos), "Classe A", 10.0))
+
+    return {
+        'parametros': vars(args),
+        'desenho': {'mb': round(len(dados) / 1e6, 2), 'textos': len(textos), 'segmentos': int(len(tab['len'])), 'raio': raio},
+        'etapas': perfil['etapas'],
+        'candidatos_por_tag': utils_dxf.histograma_candidatos(perfil['candidatos']),
+        'comprimentos': comparar_comprimentos(dutos, esperado),
+    }
+
+# ============================================================================
+# 3. CLI
+# ============================================================================
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark do leitor DXF com desenhos sintéticos.")
+    ap.add_argument("--trechos", type=int, default=500, help="trechos de duto")
+    ap.add_argument("--rotulos", type=int, default=1, help="rótulos por trecho")
+    ap.add_argument("--layers", type=int, default=1, help="layers de parede")
+    ap.add_argument("--ruido", type=int, default=5000, help="linhas de ruído")
+    ap.add_argument("--ruido-parede", type=float, default=0.2, help="fração do ruído nos layers de parede")
+    ap.add_argument("--unidade", choices=["mm", "m"], default="mm")
+    ap.add_argument("--raio", type=float, default=None, help="raio de busca (padrão: 2000 mm / 2 m)")
+    ap.add_argument("--comp-padrao", type=float, default=1.10)
+    ap.add_argument("--ignorar", default="DAMPER, VCD, REGISTRO, FILTRO, AWG")
+    ap.add_argument("--processos", type=int, default=1)
+    ap.add_argument("--recover", action="store_true", help="mede também a leitura completa com recover")
+    ap.add_argument("--sem-memoria", action="store_true", help="não usa tracemalloc (tempos mais fiéis)")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--salvar", help="grava o DXF gerado neste caminho")
+    ap.add_argument("--json", help="grava o resultado neste arquivo JSON")
+    args = ap.parse_args()
+
+    res = rodar(args)
+
+    d = res['desenho']
+    print(f"DXF: {d['mb']} MB | {d['textos']} textos | {d['segmentos']} segmentos | raio {d['raio']}")
+    print(f"{'Etapa':<22}{'Tempo (s)':>12}{'Pico (MB)':>12}{'+RSS (MB)':>12}")
+    for e in res['etapas']:
+        pico = f"{e['pico_mb']:.1f}" if 'pico_mb' in e else "-"
+        rss = f"{e['rss_cresc_mb']:.1f}" if e.get('rss_cresc_mb') is not None else "-"
+        print(f"{e['etapa']:<22}{e['tempo_s']:>12.4f}{pico:>12}{rss:>12}")
+    print("Candidatos por tag: " + " | ".join(f"{k}: {v}" for k, v in res['candidatos_por_tag'].items()))
+    c = res['comprimentos']
+    print(f"Comprimentos: {c['medidos']}/{c['rotulos']} medidos | {c['acerto_%']}% dentro de 5% | erro médio {c['erro_medio_m']} m")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f: json.dump(res, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
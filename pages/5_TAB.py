@@ -5,8 +5,9 @@ import io
 import time
 from datetime import date
 import utils_db
+import extra_streamlit_components as stx
 
-if 'logado' not in st.session_state or not st.session_state['logado']:
+if ('logado' not in st.session_state or not st.session_state['logado']) and not utils_db.restaurar_sessao(stx.CookieManager(key="cookies")):
     st.warning("🔒 Acesso negado."); st.stop()
 
 DISCIPLINA_ATUAL = "TAB"
@@ -52,7 +53,6 @@ PADRAO_QUALIDADE = [
 ]
 
 st.set_page_config(page_title="Escopo TAB", page_icon="⚖️", layout="wide")
-if 'opcoes_db' not in st.session_state: st.session_state['opcoes_db'] = utils_db.carregar_opcoes()
 
 cat_tecnica_db = f"tecnico_{DISCIPLINA_ATUAL.lower()}"
 id_projeto = st.session_state.get('id_projeto_editar')
@@ -115,7 +115,7 @@ def gerar_docx(dados):
 
 st.title(f"⚖️ {DISCIPLINA_ATUAL}")
 if dados_edit: st.info(f"Editando: {dados_edit.get('obra')} | Cliente: {dados_edit.get('cliente')}")
-opcoes = st.session_state.get('opcoes_db', {})
+opcoes = utils_db.carregar_opcoes()
 
 tab1, tab2, tab3, tab4, tab5 = st.tabs(["Cadastro", "Técnico", "Matriz", "SMS", "Comercial"])
 
@@ -123,11 +123,12 @@ with tab1:
     c1, c2 = st.columns(2)
     cliente = c1.text_input("Cliente", value=dados_edit.get('cliente', ''))
     obra = c1.text_input("Obra", value=dados_edit.get('obra', ''))
-    db_forn = utils_db.listar_fornecedores(); lista_nomes = [""] + [f['Fornecedor'] for f in db_forn]
-    val_forn_db = dados_edit.get('fornecedor', ''); idx_f = lista_nomes.index(val_forn_db) if val_forn_db in lista_nomes else 0
-    sel_forn = c1.selectbox("Fornecedor (DB):", lista_nomes, index=idx_f)
+    busca_forn = c1.text_input("Buscar Fornecedor (nome ou CNPJ):"); db_forn = utils_db.buscar_fornecedores(busca_forn)
+    val_forn_db = dados_edit.get('fornecedor', ''); lista_nomes = [""] + ([val_forn_db] if val_forn_db else []) + [f['Fornecedor'] for f in db_forn if f['Fornecedor'] != val_forn_db]
+    sel_forn = c1.selectbox("Fornecedor (DB):", lista_nomes, index=1 if val_forn_db else 0)
+    cnpj_db = next((f['CNPJ'] for f in db_forn if f['Fornecedor'] == sel_forn), '')
     forn = c1.text_input("Razão Social:", value=sel_forn if sel_forn else val_forn_db)
-    cnpj = c1.text_input("CNPJ:", value=dados_edit.get('cnpj_fornecedor', ''))
+    cnpj = c1.text_input("CNPJ:", value=dados_edit.get('cnpj_fornecedor', '') or cnpj_db)
     resp_eng = c2.text_input("Engenharia", value=dados_edit.get('responsavel', ''))
     resp_sup = c2.text_input("Suprimentos", value=dados_edit.get('resp_suprimentos', ''))
     revisao = c2.text_input("Revisão", value=dados_edit.get('revisao', 'R-00'))
@@ -139,35 +140,22 @@ with tab2:
     novo_item = c_add1.text_input("Adicionar novo item técnico:", key="novo_item_tec")
     if c_add2.button("💾 Adicionar", key="btn_add_tec"):
         if utils_db.aprender_novo_item(cat_tecnica_db, novo_item):
-            st.session_state['opcoes_db'] = utils_db.carregar_opcoes()
             st.success("Adicionado!"); time.sleep(0.5); st.rerun()
 
-    lista_tec_final = sorted(list(set(opcoes.get(cat_tecnica_db, []) + PADRAO_TECNICO)))
+    lista_tec_final = sorted(set(opcoes.get(cat_tecnica_db, ())).union(PADRAO_TECNICO))
     itens_salvos = dados_edit.get('itens_tecnicos', [])
-    if isinstance(itens_salvos, str): 
-        try: itens_salvos = eval(itens_salvos)
-        except: itens_salvos = []
-    elif not isinstance(itens_salvos, list): itens_salvos = []
     opcoes_finais = sorted(list(set(lista_tec_final + itens_salvos)))
     itens_tec = st.multiselect("Itens Técnicos:", opcoes_finais, default=itens_salvos)
     tec_livre = st.text_area("Livre Técnico:", value=dados_edit.get('tecnico_livre', ''))
     st.divider()
-    lista_qual_final = sorted(list(set(opcoes.get(f"qualidade_{DISCIPLINA_ATUAL.lower()}", []) + PADRAO_QUALIDADE)))
+    lista_qual_final = sorted(set(opcoes.get(f"qualidade_{DISCIPLINA_ATUAL.lower()}", ())).union(PADRAO_QUALIDADE))
     itens_salvos_q = dados_edit.get('itens_qualidade', [])
-    if isinstance(itens_salvos_q, str): 
-        try: itens_salvos_q = eval(itens_salvos_q)
-        except: itens_salvos_q = []
-    elif not isinstance(itens_salvos_q, list): itens_salvos_q = []
     opcoes_finais_q = sorted(list(set(lista_qual_final + itens_salvos_q)))
     itens_qual = st.multiselect("Itens Qualidade:", opcoes_finais_q, default=itens_salvos_q)
 
 with tab3:
     escolhas = {}
     matriz_salva = dados_edit.get('matriz', {})
-    if isinstance(matriz_salva, str): 
-        try: matriz_salva = eval(matriz_salva)
-        except: matriz_salva = {}
-    elif not isinstance(matriz_salva, dict): matriz_salva = {}
     for item in ITENS_MATRIZ:
         col_a, col_b = st.columns([2,1])
         col_a.write(f"**{item}**")
@@ -177,10 +165,6 @@ with tab3:
 
 with tab4:
     nrs_salvas = dados_edit.get('nrs_selecionadas', [])
-    if isinstance(nrs_salvas, str): 
-        try: nrs_salvas = eval(nrs_salvas)
-        except: nrs_salvas = []
-    elif not isinstance(nrs_salvas, list): nrs_salvas = []
     opcoes_sms = sorted(list(set(LISTA_NRS_COMPLETA + nrs_salvas)))
     nrs = st.multiselect("NRs Adicionais:", opcoes_sms, default=nrs_salvas)
     sms_livre = st.text_area("Livre SMS:", value=dados_edit.get('sms_livre', ''))
@@ -2,9 +2,11 @@ import streamlit as st
 import fitz  # PyMuPDF
 from openai import OpenAI
 import base64
+import extra_streamlit_components as stx
+import utils_db
 
 # --- 🔒 BLOCO DE SEGURANÇA ---
-if 'logado' not in st.session_state or not st.session_state['logado']:
+if ('logado' not in st.session_state or not st.session_state['logado']) and not utils_db.restaurar_sessao(stx.CookieManager(key="cookies")):
     st.warning("🔒 Acesso negado. Faça login no Dashboard.")
     st.stop()
 
@@ -1,17 +1,15 @@
 import streamlit as st
-import ezdxf
-from ezdxf import recover
 import pandas as pd
-import tempfile
-import os
-import re
-import math
 import io
+import json
 from openai import OpenAI
 from collections import Counter
+import utils_dxf
+import extra_streamlit_components as stx
+import utils_db
 
 # --- 🔒 SEGURANÇA ---
-if 'logado' not in st.session_state or not st.session_state['logado']:
+if ('logado' not in st.session_state or not st.session_state['logado']) and not utils_db.restaurar_sessao(stx.CookieManager(key="cookies")):
     st.warning("🔒 Acesso negado. Faça login no Dashboard.")
     st.stop()
 
@@ -34,6 +32,11 @@ with st.sidebar:
     st.info("ℹ️ Raio de Busca: Distância máx do texto até a linha.")
     raio_busca = st.number_input("Raio de Busca (Unidades CAD)", value=2.0, help="2.0 para Metros, 2000 para Milímetros.")
     comp_padrao = st.number_input("Comp. Padrão (Fallback)", value=1.10)
+    n_cpus = utils_dxf.nucleos_disponiveis()
+    n_processos = st.number_input("Processos em Paralelo", min_value=1, max_value=n_cpus, value=min(n_cpus, utils_dxf.MAX_PROCESSOS_PADRAO),
+                                  help="Núcleos usados na medição. Desenhos pequenos rodam em 1 processo.")
+    medir_memoria = st.checkbox("Medir memória por etapa", value=False,
+                                help="Pico de memória de cada etapa no Diagnóstico (deixa a leitura mais lenta).")
     
     st.divider()
     st.markdown("### 🎯 Filtros de Precisão")
@@ -51,187 +54,8 @@ with st.sidebar:
     tipo_isolamento = st.selectbox("Isolamento", ["Lã de Vidro", "Borracha Elast.", "Isopor", "Sem Isolamento"])
 
 # ============================================================================
-# 2. CARREGAMENTO E TEXTO
+# 2. CLASSIFICAÇÃO IA
 # ============================================================================
-def carregar_dxf_seguro(uploaded_file):
-    temp_path = None
-    try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".dxf") as tmp_file:
-            tmp_file.write(uploaded_file.getvalue())
-            temp_path = tmp_file.name
-        doc, auditor = recover.readfile(temp_path)
-        return doc, temp_path, None
-    except Exception as e:
-        return None, temp_path, str(e)
-
-def limpar_temp(path):
-    if path and os.path.exists(path):
-        try: os.remove(path)
-        except: pass
-
-def extrair_todos_textos(msp):
-    lista = []
-    for e in msp.query('TEXT MTEXT'):
-        txt = e.dxf.text if e.dxftype() == 'TEXT' else e.text
-        if txt: lista.append({'texto': txt, 'obj': e})
-    for e in msp.query('INSERT'):
-        if e.attribs:
-            for a in e.attribs:
-                t = a.dxf.text
-                if t: lista.append({'texto': t, 'obj': a})
-    return lista
-
-def limpar_parsear(txt_raw, lista_negativa, usar_filtro_vazao):
-    t = re.sub(r'\\[ACFHQTW].*?;', '', txt_raw)
-    t = re.sub(r'\\P|\\N', ' ', t)
-    t = t.replace('{','').replace('}','').strip().upper()
-    
-    for termo in lista_negativa:
-        if termo.strip() and termo.strip() in t:
-            return None, None, t 
-
-    if usar_filtro_vazao:
-        if "(" not in t or ")" not in t:
-            return None, None, t
-
-    m = re.search(r'([\d\.]+)\s*[xX*]\s*([\d\.]+)', t)
-    if m:
-        try:
-            l_str = m.group(1)
-            a_str = m.group(2)
-            l_val = float(l_str.replace('.','')) if '.' in l_str and len(l_str)>4 else float(l_str)
-            a_val = float(a_str.replace('.','')) if '.' in a_str and len(a_str)>4 else float(a_str)
-            if l_val > 50 and a_val > 50:
-                return l_val, a_val, t
-        except: pass
-    return None, None, t
-
-# ============================================================================
-# 3. MOTOR GEOMÉTRICO
-# ============================================================================
-def get_segmentos(e):
-    segs = []
-    try:
-        if e.dxftype() == 'LINE':
-            p1 = (e.dxf.start.x, e.dxf.start.y)
-            p2 = (e.dxf.end.x, e.dxf.end.y)
-            l = math.hypot(p2[0]-p1[0], p2[1]-p1[1])
-            if l > 0:
-                ang = math.degrees(math.atan2(p2[1]-p1[1], p2[0]-p1[0])) % 180
-                segs.append({'p1':p1, 'p2':p2, 'len':l, 'ang':ang})
-        elif e.dxftype() == 'LWPOLYLINE':
-            pts = e.get_points()
-            for i in range(len(pts)-1):
-                p1 = pts[i][:2] 
-                p2 = pts[i+1][:2]
-                dx, dy = p2[0]-p1[0], p2[1]-p1[1]
-                l = math.hypot(dx, dy)
-                if l > 0:
-                    ang = math.degrees(math.atan2(dy, dx)) % 180
-                    segs.append({'p1':p1, 'p2':p2, 'len':l, 'ang':ang})
-    except: pass
-    return segs
-
-def dist_paralela(s1, s2):
-    try:
-        mx, my = (s1['p1'][0]+s1['p2'][0])/2, (s1['p1'][1]+s1['p2'][1])/2
-        x1, y1 = s2['p1'][0], s2['p1'][1]
-        x2, y2 = s2['p2'][0], s2['p2'][1]
-        A = y1-y2; B = x2-x1; C = x1*y2 - x2*y1
-        denom = math.hypot(A, B)
-        if denom == 0: return float('inf')
-        return abs(A*mx + B*my + C) / denom
-    except: return float('inf')
-
-def medir_duto_geom(msp, texto_obj, w_target, h_target, layers, raio):
-    ins = texto_obj.dxf.insert
-    tx, ty = ins.x, ins.y
-    
-    candidatos = []
-    for e in msp.query('LINE LWPOLYLINE'):
-        if layers and e.dxf.layer not in layers: continue
-        try:
-            if e.dxftype()=='LINE': px, py = e.dxf.start.x, e.dxf.start.y
-            else: 
-                pts = e.get_points()
-                px, py = pts[0][0], pts[0][1]
-            if abs(px-tx) > raio or abs(py-ty) > raio: continue
-            candidatos.extend(get_segmentos(e))
-        except: pass
-        
-    if len(candidatos) < 2: return 0.0, "Sem linhas"
-
-    melhor_comp = 0.0
-    match_info = "Não medido"
-    escalas = [1.0, 0.1, 0.01, 0.001]
-    
-    for i in range(len(candidatos)):
-        s1 = candidatos[i]
-        for j in range(i+1, len(candidatos)):
-            s2 = candidatos[j]
-            if abs(s1['ang'] - s2['ang']) > 5 and abs(s1['ang'] - s2['ang']) < 175: continue
-            dist = dist_paralela(s1, s2)
-            if dist < 0.001: continue
-            
-            for esc in escalas:
-                w_t = w_target * esc
-                h_t = h_target * esc
-                tol_w, tol_h = w_t * 0.05, h_t * 0.05
-                match_w = abs(dist - w_t) < tol_w
-                match_h = abs(dist - h_t) < tol_h
-                
-                if match_w or match_h:
-                    comp_cad = (s1['len'] + s2['len']) / 2
-                    f_metro = 1.0
-                    if esc == 1.0: f_metro = 0.001
-                    elif esc == 0.1: f_metro = 0.01
-                    comp_real = comp_cad * f_metro
-                    if comp_real > melhor_comp:
-                        melhor_comp = comp_real
-                        match_info = f"Medido (Esc {esc})"
-                        
-    return melhor_comp, match_info
-
-# ============================================================================
-# 4. PROCESSAMENTO
-# ============================================================================
-def processar(doc, layers_duto, raio, padrao, blacklist_str, usar_vazao):
-    msp = doc.modelspace()
-    dutos = []
-    restos = []
-    logs = []
-    
-    blacklist = [x.strip().upper() for x in blacklist_str.split(',') if x.strip()]
-    lista = extrair_todos_textos(msp)
-    
-    for item in lista:
-        l, a, t = limpar_parsear(item['texto'], blacklist, usar_vazao)
-        obj = item['obj']
-        
-        if l:
-            # Filtro Grelha (Final 25 ou AWG)
-            eh_grelha = str(int(l)).endswith('25') or str(int(a)).endswith('25') or "AWG" in t
-            
-            if eh_grelha:
-                restos.append(t)
-                logs.append(f"💨 Grelha detectada: {t}")
-            else:
-                # Duto
-                comp_m, status = medir_duto_geom(msp, obj, l, a, layers_duto, raio)
-                val_final = comp_m if comp_m > 0 else padrao
-                orig = "Medido (Auto)" if comp_m > 0 else "Estimado (Padrão)"
-                
-                dutos.append({
-                    "Largura": l, "Altura": a, "Comp. (m)": val_final,
-                    "Origem": orig, "Tag": t
-                })
-                logs.append(f"✅ Duto: {t} -> {val_final:.2f}m ({status})")
-        else:
-            if t and any(c.isalpha() for c in t):
-                restos.append(t)
-                
-    return dutos, restos, logs
-
 def ia_class(lista):
     if not lista: return {}
     key = st.secrets.get("openai", {}).get("api_key")
@@ -262,78 +86,88 @@ def ia_class(lista):
     except: return {}
 
 # ============================================================================
-# 5. UI
+# 3. UI
 # ============================================================================
 uploaded_dxf = st.file_uploader("📂 Carregar DXF", type=["dxf"])
 
 if uploaded_dxf:
-    doc, tmp, err = carregar_dxf_seguro(uploaded_dxf)
+    # Hash e extração do arquivo atual ficam na sessão: reruns não relêem o upload
+    # e o Processar aproveita a leitura feita para listar os layers
+    id_dxf = getattr(uploaded_dxf, 'file_id', None) or (uploaded_dxf.name, uploaded_dxf.size)
+    dxf = st.session_state.get('dxf_carregado')
+    if not dxf or dxf['id'] != id_dxf:
+        with uploaded_dxf.getbuffer() as buf: dxf = {'id': id_dxf, 'hash': utils_dxf.hash_arquivo(buf), 'textos': None, 'tab': None}
+        st.session_state['dxf_carregado'] = dxf
+    hash_dxf, textos, tab, err = dxf['hash'], dxf['textos'], dxf['tab'], None
+    perfil = utils_dxf.novo_perfil(medir_memoria)
+    
+    # Layers ficam no cache: reruns do mesmo arquivo não reabrem o DXF
+    layers = utils_dxf.ler_cache(utils_dxf.chave_layers(hash_dxf))
+    if layers is None:
+        if tab is None: textos, tab, err = utils_dxf.carregar_dxf(uploaded_dxf, perfil)
+        if not err:
+            dxf['textos'], dxf['tab'] = textos, tab
+            layers = sorted(tab['layers'])
+            utils_dxf.gravar_cache(utils_dxf.chave_layers(hash_dxf), layers)
+    
     if err:
         st.error(f"Erro: {err}")
-        limpar_temp(tmp)
     else:
-        layers = sorted([l.dxf.name for l in doc.layers])
         idx = [i for i,s in enumerate(layers) if 'DUT' in s.upper() or 'DUCT' in s.upper()]
         
         st.info("Passo 1: Selecione o Layer das Paredes.")
         sel = st.multiselect("Layer Paredes:", layers, default=[layers[idx[0]]] if idx else None)
         
         if st.button("🚀 Processar", type="primary"):
-            with st.spinner("Medindo geometria..."):
-                dutos, restos, logs = processar(doc, sel, raio_busca, comp_padrao, termos_ignorar, exigir_vazao)
-                st.session_state['res_dutos'] = dutos
-                st.session_state['res_logs'] = logs
-                st.session_state['res_ia'] = ia_class(restos) if restos else {}
-        
-        limpar_temp(tmp)
+            chave = utils_dxf.chave_resultado(hash_dxf, sel, raio_busca, comp_padrao, termos_ignorar, exigir_vazao)
+            res = utils_dxf.ler_cache(chave)
+            if res is not None:
+                st.toast("♻️ Resultado recuperado do cache.")
+                perfil = res.get('perfil') or perfil
+                perfil['cache'] = True
+                if not res['ia'] and res['restos']:
+                    res['ia'] = ia_class(res['restos'])
+                    if res['ia']: utils_dxf.gravar_cache(chave, res)
+            else:
+                with st.spinner("Medindo geometria..."):
+                    if tab is None:
+                        textos, tab, err = utils_dxf.carregar_dxf(uploaded_dxf, perfil)
+                        if not err: dxf['textos'], dxf['tab'] = textos, tab
+                    if err:
+                        st.error(f"Erro: {err}")
+                    else:
+                        dutos, restos, logs = utils_dxf.processar(textos, tab, sel, raio_busca, comp_padrao, termos_ignorar, exigir_vazao, n_processos, perfil)
+                        with utils_dxf.etapa(perfil, "classificação IA") as reg:
+                            ia = ia_class(restos) if restos else {}
+                            reg['textos'] = len(restos)
+                        res = {'dutos': dutos, 'restos': restos, 'logs': logs, 'ia': ia, 'perfil': perfil}
+                        utils_dxf.gravar_cache(chave, res)
+            
+            if res is not None:
+                st.session_state['res_dutos'] = pd.DataFrame(res['dutos'])
+                st.session_state['res_logs'] = res['logs']
+                st.session_state['res_ia'] = res['ia']
+                st.session_state['res_perfil'] = perfil
+else:
+    # Arquivo removido: libera a extração guardada
+    st.session_state.pop('dxf_carregado', None)
 
 # ============================================================================
-# 6. RESULTADOS & MEMORIAL
+# 4. RESULTADOS & MEMORIAL
 # ============================================================================
 if 'res_dutos' in st.session_state:
     dutos = st.session_state['res_dutos']
     ia = st.session_state.get('res_ia', {})
     logs = st.session_state.get('res_logs', [])
+    perfil = st.session_state.get('res_perfil')
     
     t1, t2, t3, t4, t5 = st.tabs(["🌪️ Dutos", "💨 Terminais", "⚙️ Equipamentos", "⚡ Elétrica", "🔍 Diagnóstico"])
     
     with t1:
-        if dutos:
-            lista_memorial = []
-            for item in dutos:
-                larg = item['Largura']
-                alt = item['Altura']
-                comp = item['Comp. (m)']
-                maior_lado = max(larg, alt)
-                
-                bitola = 26; peso_m2 = 4.2
-                if "Classe A" in classe_pressao:
-                    if maior_lado <= 300: bitola=26; peso_m2=4.2
-                    elif maior_lado <= 750: bitola=24; peso_m2=5.4
-                    elif maior_lado <= 1500: bitola=22; peso_m2=6.8
-                    elif maior_lado <= 2100: bitola=20; peso_m2=8.6
-                    else: bitola=18; peso_m2=11.0
-                elif "Classe B" in classe_pressao:
-                    if maior_lado <= 750: bitola=24; peso_m2=5.4
-                    elif maior_lado <= 1500: bitola=22; peso_m2=6.8
-                    elif maior_lado <= 2100: bitola=20; peso_m2=8.6
-                    else: bitola=18; peso_m2=11.0
-                else: 
-                    if maior_lado <= 1000: bitola=22; peso_m2=6.8
-                    elif maior_lado <= 2100: bitola=20; peso_m2=8.6
-                    else: bitola=18; peso_m2=11.0
-                
-                perimetro = (2*larg + 2*alt) / 1000
-                area_trecho = perimetro * comp * (1 + perda_corte/100)
-                peso_trecho = area_trecho * peso_m2
-                
-                lista_memorial.append({
-                    "Tag": item['Tag'], "Largura (mm)": larg, "Altura (mm)": alt,
-                    "Comprimento (m)": comp, "Bitola (MSG)": f"#{bitola}",
-                    "Área (m²)": area_trecho, "Peso (kg)": peso_trecho, "Origem": item['Origem']
-                })
-            
-            df_mem = pd.DataFrame(lista_memorial)
+        if not dutos.empty:
+            with utils_dxf.etapa(perfil, "memorial") as reg:
+                df_mem = utils_dxf.calcular_memorial(dutos, classe_pressao, perda_corte)
+                reg['trechos'] = len(df_mem)
             df_resumo = df_mem.groupby("Bitola (MSG)")["Peso (kg)"].sum().reset_index()
             
             # --- DASHBOARD (RESTORED) ---
@@ -367,10 +201,12 @@ if 'res_dutos' in st.session_state:
                 "Área (m²)":"{:.2f}", "Peso (kg)":"{:.2f}"
             }))
             
-            output = io.BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                df_mem.to_excel(writer, sheet_name='Memorial', index=False)
-                df_resumo.to_excel(writer, sheet_name='Resumo', index=False)
+            with utils_dxf.etapa(perfil, "exportação Excel") as reg:
+                output = io.BytesIO()
+                with pd.ExcelWriter(output, engine='openpyxl') as writer:
+                    df_mem.to_excel(writer, sheet_name='Memorial', index=False)
+                    df_resumo.to_excel(writer, sheet_name='Resumo', index=False)
+                reg['linhas'] = len(df_mem)
             st.download_button("📥 Excel Memorial", output.getvalue(), "Memorial_Dutos.xlsx")
         else:
             st.warning("Nenhum duto encontrado.")
@@ -385,4 +221,24 @@ if 'res_dutos' in st.session_state:
         if ia.get("ELETRICA"): st.data_editor(pd.DataFrame(ia["ELETRICA"], columns=["Tag","Desc","Qtd"]), use_container_width=True)
         else: st.info("Vazio")
     with t5:
+        if perfil and perfil['etapas']:
+            if perfil.get('cache'): st.caption("♻️ Resultado do cache: tempos da execução original.")
+            df_etapas = pd.DataFrame(perfil['etapas'])
+            cand = perfil['candidatos']
+            
+            d1, d2, d3 = st.columns(3)
+            d1.metric("Tempo Total", f"{df_etapas['tempo_s'].sum():.2f} s")
+            d2.metric("Tags Medidas", len(cand))
+            d3.metric("Candidatos/Tag (média | máx)", f"{sum(cand)/len(cand):.0f} | {max(cand)}" if cand else "-")
+            
+            st.markdown("### ⏱️ Etapas")
+            st.caption("pico_mb: pico do tracemalloc na etapa | rss_cresc_mb: quanto a etapa subiu o pico de RSS do processo | rss_pico_proc_mb: pico do processo até ali")
+            st.dataframe(df_etapas, use_container_width=True, hide_index=True)
+            
+            st.markdown("### 📊 Candidatos por Tag")
+            hist = utils_dxf.histograma_candidatos(cand)
+            st.dataframe(pd.DataFrame({"Segmentos candidatos": list(hist), "Tags": list(hist.values())}), hide_index=True)
+            
+            st.download_button("📥 Perfil (JSON)", json.dumps(perfil, ensure_ascii=False, indent=2),
+                               "Perfil_Leitor_DXF.json", mime="application/json")
         st.text_area("Log", "\n".join(logs), height=300)
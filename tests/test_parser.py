@@ -0,0 +1,55 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import utils_dxf  # noqa: E402
+
+NEGATIVA = ["DAMPER", "VCD", "REGISTRO", "FILTRO", "AWG"]
+
+# Tags como saem do desenho (TEXT, MTEXT com códigos de formato, ATTRIB de bloco)
+# -> (largura, altura, texto limpo) com e sem o filtro de vazão
+CORPUS = [
+    # MTEXT: códigos \A \H \C \W somem, \P e \N viram espaço, chaves saem
+    (r"\A1;800X500\P(2.500)", (800.0, 500.0, "800X500 (2.500)"), (800.0, 500.0)),
+    (r"{\H0.7x;\C1;500*300}\P(850)", (500.0, 300.0, "500*300 (850)"), (500.0, 300.0)),
+    (r"{\W0.8;1000 x 1.500}\N(4000)", (1000.0, 1500.0, "1000 X 1.500 (4000)"), (1000.0, 1500.0)),
+    # Separador de milhar: "1.200" é 1200, "12.5" continua decimal
+    ("1.200x600 (3.400)", (1200.0, 600.0, "1.200X600 (3.400)"), (1200.0, 600.0)),
+    ("GRELHA AR 12.5x30 (50)", (None, None, "GRELHA AR 12.5X30 (50)"), (None, None)),
+    # ATTRIB simples, minúsculo
+    ("600x400 (1200)", (600.0, 400.0, "600X400 (1200)"), (600.0, 400.0)),
+    # Sem vazão: só passa com o filtro desligado
+    ("600x400", (None, None, "600X400"), (600.0, 400.0)),
+    # Lista negativa
+    ("DAMPER 600x400 (1200)", (None, None, "DAMPER 600X400 (1200)"), (None, None)),
+    ("VCD 300x200 (500)", (None, None, "VCD 300X200 (500)"), (None, None)),
+    ("AWG 625x625 (300)", (None, None, "AWG 625X625 (300)"), (None, None)),
+    # Dimensões até 50 não são duto
+    ("40x40 (100)", (None, None, "40X40 (100)"), (None, None)),
+    ("TEXTO QUALQUER", (None, None, "TEXTO QUALQUER"), (None, None)),
+]
+
+@pytest.mark.parametrize("txt, com_vazao, sem_vazao", CORPUS)
+def test_limpar_parsear(txt, com_vazao, sem_vazao):
+    assert utils_dxf.limpar_parsear(txt, NEGATIVA, True) == com_vazao
+    assert utils_dxf.limpar_parsear(txt, NEGATIVA, False)[:2] == sem_vazao
+
+def test_codigos_minusculos_nao_atrapalham_a_medida():
+    # \f (fonte) e \p (parágrafo) minúsculos ficam no texto, mas a bitola ainda é lida
+    assert utils_dxf.limpar_parsear(r"{\fArial|b0|i0|c0|p34;600x400 (1200)}", NEGATIVA, True)[:2] == (600.0, 400.0)
+    assert utils_dxf.limpar_parsear(r"\pxqc;{\fSimplex|c0;450X300}\P(900)", NEGATIVA, True)[:2] == (450.0, 300.0)
+
+def test_lista_negativa_vazia_e_com_espacos():
+    assert utils_dxf.limpar_parsear("DAMPER 600x400 (1200)", [], True)[:2] == (600.0, 400.0)
+    assert utils_dxf.limpar_parsear("DAMPER 600x400 (1200)", [" DAMPER ", ""], True)[:2] == (None, None)
+
+@pytest.mark.parametrize("usar_filtro_vazao", [True, False])
+def test_parsear_lote_igual_ao_individual(usar_filtro_vazao):
+    textos = [c[0] for c in CORPUS] * 3
+    esperado = [utils_dxf.limpar_parsear(t, NEGATIVA, usar_filtro_vazao) for t in textos]
+    assert utils_dxf.parsear_lote(textos, NEGATIVA, usar_filtro_vazao) == esperado
+
+def test_parsear_lote_vazio():
+    assert utils_dxf.parsear_lote([], NEGATIVA, True) == []
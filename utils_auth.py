@@ -0,0 +1,129 @@
+import hashlib
+import hmac
+import secrets
+import base64
+import threading
+import time
+from functools import lru_cache
+
+# ==================================================
+# 1. HASH DE SENHAS
+# ==================================================
+# Coluna Senha da aba Usuarios: pbkdf2_sha256$<iterações>$<sal>$<hash> (base64).
+# Senhas ainda em texto puro viram hash no primeiro login certo (utils_db);
+# para gerar o valor de uma senha nova: python utils_auth.py
+ALGORITMO = "pbkdf2_sha256"
+ITERACOES = 240000
+_SAL_TEXTO_PURO = b"siarcon-texto-puro"
+
+def _b64(b):
+    return base64.b64encode(b).decode('ascii')
+
+def gerar_hash(senha, iteracoes=ITERACOES):
+    sal = secrets.token_bytes(16)
+    dk = hashlib.pbkdf2_hmac('sha256', str(senha).encode('utf-8'), sal, iteracoes)
+    return f"{ALGORITMO}${iteracoes}${_b64(sal)}${_b64(dk)}"
+
+def eh_hash(valor):
+    return str(valor).startswith(ALGORITMO + "$")
+
+def precisa_rehash(guardado):
+    """Texto puro ou hash com menos iterações que o padrão atual."""
+    try: return not eh_hash(guardado) or int(str(guardado).split('$')[1]) < ITERACOES
+    except: return True
+
+@lru_cache(maxsize=1)
+def _hash_ficticio():
+    return gerar_hash(secrets.token_hex(16))
+
+@lru_cache(maxsize=256)
+def _derivar_texto_puro(valor):
+    return hashlib.pbkdf2_hmac('sha256', valor.encode('utf-8'), _SAL_TEXTO_PURO, ITERACOES)
+
+def conferir_senha(senha, guardado):
+    """Compara em tempo constante. guardado=None (usuário inexistente) gasta o mesmo
+    tempo de um hash e falha; senha antiga em texto puro ainda é aceita."""
+    senha = str(senha).encode('utf-8')
+    if guardado is None:
+        conferir_senha(senha.decode('utf-8'), _hash_ficticio())
+        return False
+    guardado = str(guardado)
+    if not eh_hash(guardado):
+        # Mesmo custo de um hash de verdade: o tempo não revela quem ainda está em texto puro
+        calc = hashlib.pbkdf2_hmac('sha256', senha, _SAL_TEXTO_PURO, ITERACOES)
+        return hmac.compare_digest(calc, _derivar_texto_puro(guardado))
+    try:
+        _, iteracoes, sal, dk = guardado.split('$')
+        calc = hashlib.pbkdf2_hmac('sha256', senha, base64.b64decode(sal), int(iteracoes))
+        return hmac.compare_digest(calc, base64.b64decode(dk))
+    except: return False
+
+# ==================================================
+# 2. TENTATIVAS FALHAS
+# ==================================================
+MAX_FALHAS = 5
+JANELA_FALHAS_S = 300
+
+class LimiteTentativas:
+    """Depois de max_falhas erros dentro de janela_s, a chave fica bloqueada até a
+    falha mais antiga sair da janela (em memória, por processo). A chave deve incluir
+    o cliente (ex.: (usuário, IP)) para um terceiro não conseguir bloquear o usuário."""
+
+    def __init__(self, max_falhas=MAX_FALHAS, janela_s=JANELA_FALHAS_S):
+        self.max_falhas, self.janela_s = max_falhas, janela_s
+        self.falhas = {}   # chave -> instantes das falhas recentes
+        self.trava = threading.Lock()
+
+    def _recentes(self, chave, agora):
+        recentes = [t for t in self.falhas.get(chave, []) if agora - t < self.janela_s]
+        if recentes: self.falhas[chave] = recentes
+        else: self.falhas.pop(chave, None)
+        return recentes
+
+    def bloqueado(self, chave):
+        """Segundos até liberar (0 = liberado)."""
+        agora = time.time()
+        with self.trava:
+            recentes = self._recentes(chave, agora)
+            if len(recentes) < self.max_falhas: return 0
+            return int(recentes[-self.max_falhas] + self.janela_s - agora) + 1
+
+    def falhou(self, chave):
+        agora = time.time()
+        with self.trava:
+            # Descarta as chaves vencidas: nomes inventados não acumulam na memória
+            for k in [k for k, v in self.falhas.items() if agora - v[-1] >= self.janela_s]: del self.falhas[k]
+            self.falhas[chave] = self._recentes(chave, agora) + [agora]
+
+    def limpar(self, chave):
+        with self.trava: self.falhas.pop(chave, None)
+
+# ==================================================
+# 3. TOKENS DE SESSÃO
+# ==================================================
+# <usuário em base64>.<expira em epoch>.<HMAC-SHA256 de ambos + extra>; extra
+# amarra o token a algo do usuário (ex.: o hash da senha, que ao mudar invalida)
+def _assinar(corpo, segredo, extra):
+    msg = f"{corpo}|{extra}".encode('utf-8')
+    return base64.urlsafe_b64encode(hmac.new(str(segredo).encode('utf-8'), msg, hashlib.sha256).digest()).decode('ascii')
+
+def gerar_token(usuario, segredo, validade_s, extra=""):
+    corpo = f"{base64.urlsafe_b64encode(str(usuario).encode('utf-8')).decode('ascii')}.{int(time.time() + validade_s)}"
+    return f"{corpo}.{_assinar(corpo, segredo, extra)}"
+
+def usuario_do_token(token):
+    """Usuário escrito no token, sem conferir assinatura (None se malformado)."""
+    try: return base64.urlsafe_b64decode(str(token).split('.')[0]).decode('utf-8')
+    except: return None
+
+def conferir_token(token, segredo, extra=""):
+    """Assinatura confere e o token ainda não expirou."""
+    try:
+        usuario, expira, assinatura = str(token).split('.')
+        if int(expira) < time.time(): return False
+        return hmac.compare_digest(assinatura, _assinar(f"{usuario}.{expira}", segredo, extra))
+    except: return False
+
+if __name__ == "__main__":
+    import getpass
+    print(gerar_hash(getpass.getpass("Senha: ")))
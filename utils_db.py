@@ -1,7 +1,16 @@
 import streamlit as st
 import pandas as pd
 import gspread
-from datetime import datetime
+import threading
+import time
+import json
+import ast
+import bisect
+import unicodedata
+from types import MappingProxyType
+from datetime import datetime, timedelta
+import utils_sqlite
+import utils_auth
 
 # ==================================================
 # 1. CONEXÃO E CACHE
@@ -23,147 +32,405 @@ def _conectar_gsheets():
         print(f"Erro Conexão: {e}")
         return None
 
-def _ler_aba_como_df(nome_aba):
-    sh = _conectar_gsheets()
-    if not sh: return pd.DataFrame()
-    try:
-        try: ws = sh.worksheet(nome_aba)
-        except: 
-            try: ws = sh.add_worksheet(nome_aba, 100, 20)
-            except: return pd.DataFrame()
-        
-        data = ws.get_all_records()
-        return pd.DataFrame(data)
-    except: return pd.DataFrame()
+# Leituras por aba ficam em memória por TTL_ABAS segundos; cada escrita nossa
+# invalida a aba, então a próxima leitura já vem atualizada
+TTL_ABAS = 60
+_cache_abas = {}     # nome_aba -> (lido_em, df)
+_geracao_abas = {}   # nome_aba -> nº de invalidações (descarta leitura que cruzou uma escrita)
+_trava_abas = threading.Lock()
+
+def invalidar_aba(*nomes_abas):
+    """Sem argumentos limpa todas as abas (e pede ao backend uma releitura da origem)."""
+    with _trava_abas:
+        for nome in (nomes_abas or set(_cache_abas) | set(_geracao_abas)):
+            _cache_abas.pop(nome, None)
+            _geracao_abas[nome] = _geracao_abas.get(nome, 0) + 1
+    if not nomes_abas or "FORNECEDORES" in nomes_abas or "Dados" in nomes_abas:
+        _catalogo_fornecedores['lido_em'] = 0.0
+    if not nomes_abas:
+        _esquecer_projetos_lidos()
+        _backend().atualizar()
+
+def _ler_aba_como_df(nome_aba, ttl=None):
+    ttl = TTL_ABAS if ttl is None else ttl
+    with _trava_abas:
+        item = _cache_abas.get(nome_aba)
+        geracao = _geracao_abas.get(nome_aba, 0)
+    if item and time.time() - item[0] < ttl:
+        return item[1].copy()
+    
+    try: df = _backend().ler_aba(nome_aba)
+    except: df = None
+    if df is None: return pd.DataFrame()
+    
+    with _trava_abas:
+        if _geracao_abas.get(nome_aba, 0) == geracao:
+            _cache_abas[nome_aba] = (time.time(), df)
+            # Projetos relido: o índice por _id é remontado a partir desta leitura
+            if nome_aba == "Projetos": _indice_projetos['por_id'] = None
+    return df.copy()
+
+def sincronizacao_pendente():
+    """Escritas locais ainda não enviadas ao Sheets (None fora do modo espelho)."""
+    return _backend().pendentes()
 
 # ==================================================
 # 2. AUTENTICAÇÃO
 # ==================================================
+# Usuário -> senhas guardadas (hash), remontado a cada TTL_USUARIOS ou quando a aba
+# Usuarios é invalidada: tentativas de login não leem o Sheets
+TTL_USUARIOS = 300
+_indice_usuarios = {'senhas': {}, 'geracao': None, 'lido_em': 0.0}
+_trava_usuarios = threading.Lock()
+_tentativas_login = utils_auth.LimiteTentativas()
+
+def _senhas_usuarios():
+    c = _indice_usuarios
+    with _trava_usuarios:
+        geracao = _geracao_abas.get("Usuarios", 0)
+        if c['geracao'] != geracao or time.time() - c['lido_em'] >= TTL_USUARIOS:
+            df = _ler_aba_como_df("Usuarios")
+            senhas = {}
+            if not df.empty:
+                for u, s in zip(df['Usuario'].astype(str), df['Senha'].astype(str)): senhas.setdefault(u, []).append(s)
+            # Aba vazia (ou falha de leitura) não fica em cache: a próxima tentativa relê
+            c.update(senhas=senhas, geracao=geracao, lido_em=time.time() if senhas else 0.0)
+        return c['senhas']
+
+def _chave_tentativas(usuario):
+    # Usuário + IP do navegador (quando o Streamlit informa): errar a senha de outro
+    # usuário de outra máquina não bloqueia o dono da conta
+    try: cliente = st.context.ip_address
+    except: cliente = None
+    if not cliente:
+        try: cliente = st.context.headers.get("X-Forwarded-For", "").split(",")[0].strip()
+        except: cliente = None
+    return (str(usuario), cliente or "")
+
 def verificar_login_db(usuario, senha):
-    df = _ler_aba_como_df("Usuarios")
-    if df.empty:
-        if usuario == "admin" and senha == "1234": return True
-        return False
-    
-    df['Usuario'] = df['Usuario'].astype(str)
-    df['Senha'] = df['Senha'].astype(str)
+    usuario = str(usuario)
+    chave = _chave_tentativas(usuario)
+    if _tentativas_login.bloqueado(chave): return False
+    senhas = _senhas_usuarios()
+    if not senhas:
+        ok = utils_auth.conferir_senha(f"{usuario}:{senha}", "admin:1234")
+    else:
+        ok, certa = False, None
+        for guardada in senhas.get(usuario) or [None]:
+            if utils_auth.conferir_senha(senha, guardada): ok, certa = True, guardada
+        if ok and utils_auth.precisa_rehash(certa): _migrar_senha(usuario, certa, senha)
     
-    user_encontrado = df[(df['Usuario'] == str(usuario)) & (df['Senha'] == str(senha))]
-    return not user_encontrado.empty
+    if ok: _tentativas_login.limpar(chave)
+    else: _tentativas_login.falhou(chave)
+    return ok
+
+def _migrar_senha(usuario, antiga, senha):
+    # Senha em texto puro (ou hash fraco) conferiu: grava o hash no lugar
+    try:
+        if _backend().gravar_senha(usuario, antiga, utils_auth.gerar_hash(senha)): invalidar_aba("Usuarios")
+    except Exception as e:
+        print(f"Erro Migração de Senha: {e}")
+
+def login_bloqueado(usuario):
+    """Segundos até o usuário poder tentar de novo (0 = liberado)."""
+    return _tentativas_login.bloqueado(_chave_tentativas(usuario))
+
+# Sessão persistente: cookie assinado com st.secrets["sessao"]["segredo"]
+# (sem o segredo, continua pedindo login a cada recarga)
+#   [sessao]
+#   segredo = "..."
+#   dias = 7
+COOKIE_SESSAO = "siarcon_sessao"
+
+def _config_sessao():
+    try: cfg = dict(st.secrets.get("sessao", {}))
+    except: cfg = {}
+    return cfg.get("segredo"), float(cfg.get("dias", 7))
+
+def _extra_token(usuario):
+    # Trocar a senha na aba Usuarios derruba os tokens já emitidos
+    return "|".join(_senhas_usuarios().get(str(usuario), []))
+
+def criar_token_sessao(usuario):
+    """(token, expira_em) para gravar no cookie; (None, None) sem segredo configurado."""
+    segredo, dias = _config_sessao()
+    if not segredo: return None, None
+    token = utils_auth.gerar_token(usuario, segredo, dias * 86400, _extra_token(usuario))
+    return token, datetime.now() + timedelta(days=dias)
+
+def usuario_da_sessao(token):
+    """Usuário de um token válido (assinatura, validade e usuário ainda cadastrado) ou None."""
+    segredo, _ = _config_sessao()
+    usuario = utils_auth.usuario_do_token(token) if token and segredo else None
+    if usuario is None: return None
+    senhas = _senhas_usuarios()
+    if usuario not in senhas and (senhas or usuario != "admin"): return None
+    return usuario if utils_auth.conferir_token(token, segredo, _extra_token(usuario)) else None
+
+def restaurar_sessao(cookies):
+    """Marca a sessão como logada se o cookie (CookieManager) tiver um token válido."""
+    try: usuario = usuario_da_sessao(cookies.get(COOKIE_SESSAO))
+    except: usuario = None
+    if usuario is None: return False
+    st.session_state['logado'] = True
+    st.session_state['usuario_atual'] = usuario
+    return True
 
 # ==================================================
 # 3. FUNÇÕES DE PROJETO (COM AUTO-CORREÇÃO DE COLUNAS)
 # ==================================================
+# Colunas mínimas para o dashboard não quebrar
+COLS_MINIMAS = ['_id', 'status', 'disciplina', 'cliente', 'obra', 'prazo']
+
+# Campos lista/dict do projeto: gravados como JSON e devolvidos nativos por
+# buscar_projeto_por_id (linhas antigas, gravadas com str(), ainda são lidas)
+CAMPOS_ESTRUTURADOS = {'itens_tecnicos': list, 'itens_qualidade': list, 'matriz': dict, 'nrs_selecionadas': list}
+
+def _codificar_projeto(dados):
+    linha = {}
+    for k, v in dados.items():
+        if k in CAMPOS_ESTRUTURADOS and isinstance(v, (list, tuple, dict)):
+            linha[k] = json.dumps(v, ensure_ascii=False)
+        else: linha[k] = str(v)
+    return linha
+
+def _decodificar_campo(chave, valor):
+    tipo = CAMPOS_ESTRUTURADOS[chave]
+    if isinstance(valor, tipo): return valor
+    txt = str(valor).strip() if valor is not None else ""
+    if not txt: return tipo()
+    try: v = json.loads(txt)
+    except ValueError:
+        # Formato antigo: repr do Python (aspas simples)
+        try: v = ast.literal_eval(txt)
+        except (ValueError, SyntaxError): return tipo()
+    return v if isinstance(v, tipo) else tipo()
+
+def _decodificar_projeto(reg):
+    for c in CAMPOS_ESTRUTURADOS:
+        if c in reg: reg[c] = _decodificar_campo(c, reg[c])
+    return reg
+
 def listar_todos_projetos():
     df = _ler_aba_como_df("Projetos")
-    # Garante colunas mínimas para o dashboard não quebrar
-    cols_minimas = ['_id', 'status', 'disciplina', 'cliente', 'obra', 'prazo']
-    if df.empty: return pd.DataFrame(columns=cols_minimas)
+    if df.empty: return pd.DataFrame(columns=COLS_MINIMAS)
     
-    for c in cols_minimas: 
+    for c in COLS_MINIMAS: 
         if c not in df.columns: df[c] = ""
         
     if '_id' in df.columns: df['_id'] = df['_id'].astype(str)
     return df
 
-def buscar_projeto_por_id(id_projeto):
+# Índice _id -> projeto montado sobre a leitura em cache da aba Projetos e
+# corrigido a cada save/exclusão: abrir um projeto vira consulta num dict
+_indice_projetos = {'por_id': None, 'colunas': [], 'repetidos': set(), 'lido_em': 0.0}
+
+def _indice_pronto():
+    ind = _indice_projetos
+    return ind['por_id'] is not None and time.time() - ind['lido_em'] < TTL_ABAS
+
+def _aba_em_cache(nome_aba):
+    with _trava_abas:
+        item = _cache_abas.get(nome_aba)
+    return item is not None and time.time() - item[0] < TTL_ABAS
+
+def _indice_por_id():
+    ind = _indice_projetos
+    with _trava_abas:
+        if _indice_pronto(): return ind['por_id']
     df = listar_todos_projetos()
-    if df.empty: return None
-    projeto = df[df['_id'] == str(id_projeto)]
-    if not projeto.empty:
-        # Preenche vazios com string vazia para não travar os campos de texto
-        return projeto.fillna("").iloc[0].to_dict()
-    return None
+    # Preenche vazios com string vazia para não travar os campos de texto
+    por_id, repetidos = {}, set()
+    for reg in df.fillna("").to_dict('records'):
+        if reg['_id'] in por_id: repetidos.add(reg['_id'])
+        else: por_id[reg['_id']] = reg
+    # Leitura vazia (ou que falhou) não conta como índice pronto: a próxima busca tenta de novo
+    with _trava_abas:
+        ind.update(por_id=por_id, colunas=list(df.columns), repetidos=repetidos,
+                   lido_em=time.time() if por_id else 0.0)
+    return por_id
+
+def _esquecer_indice():
+    with _trava_abas: _indice_projetos['por_id'] = None
+
+def _indexar_projeto(dados, novo):
+    """Reflete um save (dados já codificados) no índice: a linha inteira é regravada, como no Sheets."""
+    id_proj = str(dados['_id'])
+    with _trava_abas:
+        ind = _indice_projetos
+        if ind['por_id'] is None: return
+        if novo and id_proj in ind['por_id']:
+            ind['repetidos'].add(id_proj)   # _id repetido: a busca continua achando o primeiro
+            return
+        ind['colunas'] += [k for k in dados if k not in ind['colunas']]
+        reg = {c: "" for c in ind['colunas']}
+        reg.update(dados)
+        ind['por_id'][id_proj] = reg
+
+def _desindexar_projeto(id_projeto):
+    id_proj = str(id_projeto)
+    with _trava_abas:
+        ind = _indice_projetos
+        if ind['por_id'] is None: return
+        # Com _id repetido sobrou outra linha: o índice é remontado na próxima busca
+        if id_proj in ind['repetidos']: ind['por_id'] = None
+        else: ind['por_id'].pop(id_proj, None)
+
+# Linhas baixadas sozinhas (sem a aba inteira) ficam TTL_ABAS em memória: os reruns da
+# página de disciplina não repetem a leitura; cada escrita no projeto descarta a sua
+_projetos_lidos = {}   # _id -> (lido_em, linha crua)
+
+def _esquecer_projetos_lidos(*ids):
+    with _trava_abas:
+        if not ids: _projetos_lidos.clear()
+        for i in ids: _projetos_lidos.pop(str(i), None)
+
+def buscar_projeto_por_id(id_projeto):
+    # Nada da aba em memória: baixa só o cabeçalho + a linha do projeto
+    if not _indice_pronto() and not _aba_em_cache("Projetos"):
+        id_proj = str(id_projeto)
+        with _trava_abas:
+            item = _projetos_lidos.get(id_proj)
+            geracao = _geracao_abas.get("Projetos", 0)
+        if item and time.time() - item[0] < TTL_ABAS: projeto = dict(item[1])
+        else:
+            try: projeto = _backend().ler_projeto(id_projeto)
+            except: projeto = None
+            if projeto is not None:
+                with _trava_abas:
+                    if _geracao_abas.get("Projetos", 0) == geracao: _projetos_lidos[id_proj] = (time.time(), dict(projeto))
+        if projeto is not None:
+            for c in COLS_MINIMAS: projeto.setdefault(c, "")
+            return _decodificar_projeto(projeto)
+    projeto = _indice_por_id().get(str(id_projeto))
+    return _decodificar_projeto(dict(projeto)) if projeto is not None else None
 
 def salvar_projeto(dados):
     return registrar_projeto(dados)
 
+# _id = timestamp em segundos; ids dados no mesmo segundo (ou já vistos) avançam
+# um segundo, então um lote nunca repete _id
+_ultimo_id = {'valor': None}   # datetime do último _id emitido
+_trava_ids = threading.Lock()
+
+def _novos_ids(n):
+    with _trava_ids:
+        conhecidos = set(_mapa_projetos['linhas']) | set(_indice_projetos['por_id'] or ())
+        atual = datetime.now().replace(microsecond=0)
+        if _ultimo_id['valor'] is not None: atual = max(atual, _ultimo_id['valor'] + timedelta(seconds=1))
+        ids = []
+        while len(ids) < n:
+            id_proj = atual.strftime("%Y%m%d%H%M%S")
+            if id_proj not in conhecidos: ids.append(id_proj)
+            atual += timedelta(seconds=1)
+        _ultimo_id['valor'] = atual - timedelta(seconds=1)
+        return ids
+
 def registrar_projeto(dados):
-    sh = _conectar_gsheets()
-    if not sh: return False
+    # Gera ID se não tiver
+    novo = '_id' not in dados or not dados['_id']
     try:
-        # 1. Tenta pegar a aba ou criar
-        try: ws = sh.worksheet("Projetos")
-        except: 
-            ws = sh.add_worksheet("Projetos", 100, 20)
-        
-        # 2. Pega os headers atuais (cabeçalho)
-        headers_atuais = ws.row_values(1)
-        if not headers_atuais:
-            headers_atuais = ['_id', 'status', 'disciplina', 'cliente', 'obra']
-            ws.append_row(headers_atuais)
-
-        # --- A MÁGICA ACONTECE AQUI ---
-        # 3. Verifica se tem alguma chave nova (ex: itens_tecnicos) que não tem coluna ainda
-        novas_colunas = []
-        for chave in dados.keys():
-            if chave not in headers_atuais:
-                novas_colunas.append(chave)
-        
-        # Se tiver coluna nova faltando, cria ela na planilha
-        if novas_colunas:
-            # Adiciona colunas extras
-            ws.add_cols(len(novas_colunas))
-            # Atualiza a lista local de headers e escreve na linha 1
-            headers_atuais.extend(novas_colunas)
-            ws.update(range_name="A1", values=[headers_atuais])
-
-        # 4. Gera ID se não tiver
-        if '_id' not in dados or not dados['_id']: 
-            dados['_id'] = datetime.now().strftime("%Y%m%d%H%M%S")
-
-        # 5. Prepara a linha de dados na ordem correta dos headers
-        row_data = []
-        for h in headers_atuais:
-            valor = str(dados.get(h, "")) # Converte tudo para string para evitar erro
-            row_data.append(valor)
-
-        # 6. Busca se já existe para atualizar
-        cell = None
-        try: cell = ws.find(str(dados['_id']), in_column=1)
-        except: pass
-
-        if cell: 
-            # Atualiza linha existente
-            ws.update(range_name=f"A{cell.row}", values=[row_data])
-        else: 
-            # Cria nova linha
-            ws.append_row(row_data)
-            
+        if novo: dados['_id'] = _novos_ids(1)[0]
+        else: _esquecer_projetos_lidos(dados['_id'])
+        linha = _codificar_projeto(dados)
+        _backend().gravar_projeto(linha, novo)
+        invalidar_aba("Projetos")
+        _indexar_projeto(linha, novo)
         return True
     except Exception as e:
         print(f"ERRO CRÍTICO AO SALVAR: {e}")
+        invalidar_aba("Projetos")
+        _esquecer_indice()
         return False
 
+def registrar_projetos_em_lote(lista):
+    """Cria vários projetos novos numa escrita só. Retorna os _ids gerados ([] se falhar)."""
+    if not lista: return []
+    try:
+        ids = _novos_ids(len(lista))
+        for dados, id_proj in zip(lista, ids): dados['_id'] = id_proj
+        linhas = [_codificar_projeto(dados) for dados in lista]
+        _backend().gravar_projetos(linhas, True)
+        invalidar_aba("Projetos")
+        for linha in linhas: _indexar_projeto(linha, True)
+        return ids
+    except Exception as e:
+        print(f"ERRO CRÍTICO AO SALVAR LOTE: {e}")
+        invalidar_aba("Projetos")
+        _esquecer_indice()
+        return []
+
 def excluir_projeto(id_projeto):
-    sh = _conectar_gsheets()
-    if not sh: return False
+    _esquecer_projetos_lidos(id_projeto)
     try:
-        ws = sh.worksheet("Projetos")
-        cell = ws.find(str(id_projeto), in_column=1)
-        if cell:
-            ws.delete_rows(cell.row)
-            return True
-    except: pass
-    return False
+        ok = _backend().excluir_projeto(id_projeto)
+        invalidar_aba("Projetos")
+        if ok: _desindexar_projeto(id_projeto)
+        return ok
+    except:
+        invalidar_aba("Projetos")
+        _esquecer_indice()
+        return False
+
+def mover_status(ids, novo_status):
+    """Troca só a célula de status dos projetos, numa chamada só. Retorna quantos mudaram."""
+    ids = list(dict.fromkeys(str(i) for i in ids))
+    if not ids: return 0
+    _esquecer_projetos_lidos(*ids)
+    try:
+        n = _backend().gravar_status(ids, novo_status)
+        _aplicar_status_em_cache(ids, novo_status)
+        return n
+    except Exception as e:
+        print(f"ERRO AO MOVER STATUS: {e}")
+        invalidar_aba("Projetos")
+        _esquecer_indice()
+        return 0
+
+def _aplicar_status_em_cache(ids, status):
+    # Corrige a leitura em memória em vez de descartá-la: o rerun do quadro não rebaixa a aba
+    with _trava_abas:
+        _geracao_abas["Projetos"] = _geracao_abas.get("Projetos", 0) + 1
+        item = _cache_abas.get("Projetos")
+        if item is not None:
+            df = item[1].copy()
+            if '_id' in df.columns:
+                if 'status' not in df.columns: df['status'] = ""
+                chaves = df['_id'].astype(str)
+                df.loc[chaves.isin(ids) & ~chaves.duplicated(), 'status'] = status
+                _cache_abas["Projetos"] = (item[0], df)
+            else: _cache_abas.pop("Projetos")
+        if _indice_projetos['por_id'] is not None:
+            for i in ids:
+                reg = _indice_projetos['por_id'].get(i)
+                if reg is not None: reg['status'] = status
 
 # ==================================================
 # 4. AUXILIARES
 # ==================================================
-def listar_fornecedores():
-    sh = _conectar_gsheets()
-    if not sh: return []
-    try:
-        ws = sh.worksheet("FORNECEDORES")
-        vals = ws.get_all_values()
-        if len(vals) > 1:
-            lista = []
-            for row in vals[1:]:
-                if row and row[0]: 
-                    cnpj = row[1] if len(row) > 1 else ""
-                    lista.append({'Fornecedor': row[0], 'CNPJ': cnpj})
-            return lista
-    except: pass
+# Catálogo de fornecedores: lido uma vez por processo (renovado a cada
+# TTL_FORNECEDORES) com índice ordenado para busca por prefixo sem acento
+TTL_FORNECEDORES = 600
+TTL_FORNECEDORES_VAZIO = 30   # catálogo vazio ou leitura que falhou: tenta de novo logo
+_catalogo_fornecedores = {'lista': [], 'chaves': [], 'lido_em': 0.0, 'ttl': TTL_FORNECEDORES}
+_trava_fornecedores = threading.Lock()
+
+def _normalizar(texto):
+    texto = unicodedata.normalize('NFKD', str(texto))
+    return " ".join("".join(c for c in texto if not unicodedata.combining(c)).lower().split())
+
+def _ler_fornecedores():
+    """Lista de fornecedores; None se a leitura da aba FORNECEDORES falhar."""
+    try: linhas = _backend().ler_linhas("FORNECEDORES")
+    except: linhas = None
+    if linhas is None: return None
+    if linhas:
+        lista = []
+        for row in linhas:
+            if row and row[0]: 
+                cnpj = row[1] if len(row) > 1 else ""
+                lista.append({'Fornecedor': row[0], 'CNPJ': cnpj})
+        return lista
     
     # Fallback para aprender da aba Dados se não tiver aba fornecedores
     df = _ler_aba_como_df("Dados")
@@ -171,25 +438,494 @@ def listar_fornecedores():
         return df[['Fornecedor', 'CNPJ']].dropna(subset=['Fornecedor']).drop_duplicates().to_dict('records')
     return []
 
-def carregar_opcoes():
-    df = _ler_aba_como_df("Dados")
-    opcoes = {'sms': []}
+def _catalogo():
+    c = _catalogo_fornecedores
+    with _trava_fornecedores:
+        if c['lido_em'] and time.time() - c['lido_em'] < c['ttl']: return c
+        lista = _ler_fornecedores()
+        if lista is None:
+            # Falhou: segue com o que já tinha (não cai para a aba Dados) e tenta de novo logo
+            c.update(lido_em=time.time(), ttl=TTL_FORNECEDORES_VAZIO)
+            return c
+        lista = sorted(lista, key=lambda f: _normalizar(f['Fornecedor']))
+        # Chaves: o nome a partir de cada palavra ("sao joao" acha "Ar Cond. São João")
+        # e o CNPJ só com dígitos
+        chaves = set()
+        for i, f in enumerate(lista):
+            palavras = _normalizar(f['Fornecedor']).split()
+            for k in range(len(palavras)): chaves.add((" ".join(palavras[k:]), i))
+            cnpj = "".join(ch for ch in str(f.get('CNPJ', '')) if ch.isdigit())
+            if cnpj: chaves.add((cnpj, i))
+        c.update(lista=lista, chaves=sorted(chaves), lido_em=time.time(),
+                 ttl=TTL_FORNECEDORES if lista else TTL_FORNECEDORES_VAZIO)
+        return c
+
+def listar_fornecedores():
+    return list(_catalogo()['lista'])
+
+def buscar_fornecedores(termo="", limite=50):
+    """Fornecedores com alguma palavra do nome (ou o CNPJ) começando por termo."""
+    c = _catalogo()
+    termo = _normalizar(termo)
+    if not termo: return c['lista'][:limite]
+    if not any(ch.isalpha() for ch in termo):
+        termo = "".join(ch for ch in termo if ch.isdigit()) or termo
+    achados = set()
+    for chave, i in c['chaves'][bisect.bisect_left(c['chaves'], (termo,)):]:
+        if not chave.startswith(termo): break
+        achados.add(i)
+    return [c['lista'][i] for i in sorted(achados)[:limite]]
+
+# Catálogo de opções (categoria -> itens ordenados), montado uma vez por processo
+# e só remontado quando a aba Dados é relida de fora (refresh, espelho) ou após
+# TTL_OPCOES; itens aprendidos entram direto no catálogo
+TTL_OPCOES = 600
+_catalogo_opcoes = {'dados': {}, 'opcoes': MappingProxyType({}), 'geracao': None, 'lido_em': 0.0}
+_trava_opcoes = threading.Lock()
+
+# Itens aprendidos ainda não gravados: acumulam por ESPERA_ITENS_S e vão num lote só
+ESPERA_ITENS_S = 2
+ESPERA_ITENS_FALHA_S = 30
+_itens_pendentes = {}   # (categoria, item) -> conferido contra um catálogo lido de fato
+_trava_itens = threading.Lock()
+_trava_gravar_itens = threading.Lock()   # um lote por vez (não reenvia o que está em voo)
+_timer_itens = None
+
+def _montar_opcoes(df):
+    dados = {'sms': ()}
     if not df.empty and 'Categoria' in df.columns and 'Item' in df.columns:
-        df['Categoria'] = df['Categoria'].astype(str).str.lower().str.strip()
-        for cat in df['Categoria'].unique():
-            itens = sorted(df[df['Categoria'] == cat]['Item'].unique().tolist())
-            opcoes[cat] = itens
-    return opcoes
+        cats = df['Categoria'].astype(str).str.lower().str.strip()
+        for cat, itens in df['Item'].groupby(cats, sort=False):
+            dados[cat] = tuple(sorted(itens.unique().tolist()))
+    return dados
+
+def _incluir_opcoes(dados, itens):
+    for cat, item in itens:
+        atuais = dados.get(cat, ())
+        if item not in atuais: dados[cat] = tuple(sorted(atuais + (item,)))
+
+def carregar_opcoes():
+    """Mapa somente leitura categoria -> tupla ordenada de itens (compartilhado entre sessões)."""
+    c = _catalogo_opcoes
+    with _trava_opcoes:
+        geracao = _geracao_abas.get("Dados", 0)
+        if c['geracao'] == geracao and time.time() - c['lido_em'] < TTL_OPCOES: return c['opcoes']
+        df = _ler_aba_como_df("Dados")
+        if df.empty:
+            # Falha de leitura (ou aba vazia): não fica em cache e não apaga o que já havia
+            if c['geracao'] is None:
+                c['dados'] = _montar_opcoes(df)
+                with _trava_itens: _incluir_opcoes(c['dados'], list(_itens_pendentes))
+                c['opcoes'] = MappingProxyType(c['dados'])
+            return c['opcoes']
+        c['dados'] = _montar_opcoes(df)
+        with _trava_itens: _incluir_opcoes(c['dados'], list(_itens_pendentes))
+        c['opcoes'] = MappingProxyType(c['dados'])
+        c['geracao'], c['lido_em'] = geracao, time.time()
+        return c['opcoes']
 
 def aprender_novo_item(categoria, novo_item):
-    sh = _conectar_gsheets()
-    if not sh: return False
+    """Entra na hora no catálogo; a gravação na aba Dados sai em lote logo depois."""
+    cat, item = str(categoria).lower().strip(), str(novo_item).strip()
+    if not cat or not item: return False
+    if item in carregar_opcoes().get(cat, ()): return True   # já existe: nada a gravar
+    with _trava_opcoes:
+        # Catálogo que nunca carregou (Dados falhou) não serve para deduplicar: confere na gravação
+        conferido = _catalogo_opcoes['geracao'] is not None
+        with _trava_itens: _itens_pendentes[(cat, item)] = conferido
+        _incluir_opcoes(_catalogo_opcoes['dados'], [(cat, item)])
+    _agendar_itens()
+    return True
+
+def _agendar_itens(espera=ESPERA_ITENS_S):
+    global _timer_itens
+    with _trava_itens:
+        if _timer_itens is not None: return
+        _timer_itens = threading.Timer(espera, gravar_itens_pendentes)
+        _timer_itens.daemon = True
+        _timer_itens.start()
+
+def gravar_itens_pendentes():
+    """Grava os itens aprendidos acumulados; em falha voltam para a fila e há nova tentativa."""
+    global _timer_itens
+    with _trava_gravar_itens:
+        with _trava_itens:
+            _timer_itens = None
+            lote = list(_itens_pendentes)
+            conferir = not all(_itens_pendentes.values())
+        if not lote: return True
+        try:
+            novos = lote
+            if conferir:
+                df = _backend().ler_aba("Dados")
+                if df is None: raise RuntimeError("Falha ao ler a aba Dados")
+                existentes = set()
+                if not df.empty and 'Categoria' in df.columns and 'Item' in df.columns:
+                    existentes = set(zip(df['Categoria'].astype(str).str.lower().str.strip(), df['Item'].astype(str)))
+                novos = [k for k in lote if k not in existentes]
+            if novos: _backend().aprender_itens(novos)
+        except Exception as e:
+            print(f"Erro Aprender Itens: {e}")
+            _agendar_itens(ESPERA_ITENS_FALHA_S)
+            return False
+        with _trava_itens:
+            for k in lote: _itens_pendentes.pop(k, None)
+        
+        # A aba mudou, mas o catálogo já tem os itens: não precisa remontar
+        with _trava_opcoes:
+            em_dia = _catalogo_opcoes['geracao'] == _geracao_abas.get("Dados", 0)
+            invalidar_aba("Dados")
+            if em_dia: _catalogo_opcoes['geracao'] = _geracao_abas.get("Dados", 0)
+        return True
+
+# ==================================================
+# 5. BACKENDS DE ARMAZENAMENTO
+# ==================================================
+# Escolhido em st.secrets (sem a seção, tudo vai direto ao Google Sheets):
+#   [banco]
+#   backend = "sheets" | "sqlite" | "espelho"
+#   sqlite = "siarcon.db"
+# "sqlite" roda só local (testes de carga/CI sem credenciais do Google);
+# "espelho" lê do SQLite e envia as escritas ao Sheets em segundo plano.
+ABAS_ESPELHO = ["Projetos", "Dados", "FORNECEDORES", "Usuarios"]
+
+@st.cache_resource
+def _backend():
+    try: cfg = dict(st.secrets.get("banco", {}))
+    except: cfg = {}
+    tipo = cfg.get("backend", "espelho" if cfg.get("espelho_sqlite") else "sheets")
+    caminho = cfg.get("sqlite") or cfg.get("espelho_sqlite") or "siarcon.db"
     try:
+        if tipo == "sqlite": return BackendSQLite(utils_sqlite.BancoSQLite(caminho))
+        if tipo == "espelho": return BackendEspelho(utils_sqlite.BancoSQLite(caminho), BackendSheets())
+    except Exception as e:
+        print(f"Erro Backend {tipo}: {e}")
+    return BackendSheets()
+
+# --- Google Sheets ----------------------------------------------------------
+# Cabeçalho e mapa _id -> nº da linha da aba Projetos ficam em memória,
+# assim cada save vira um único batch_update na API do Sheets
+TTL_MAPA_PROJETOS = 60
+HEADERS_PADRAO = ['_id', 'status', 'disciplina', 'cliente', 'obra']
+_mapa_projetos = {'ws': None, 'headers': [], 'linhas': {}, 'n_cols': 0, 'lido_em': 0.0}
+_trava_projetos = threading.Lock()
+
+def _carregar_mapa_projetos(sh, forcar=False):
+    m = _mapa_projetos
+    if not forcar and m['ws'] is not None and time.time() - m['lido_em'] < TTL_MAPA_PROJETOS:
+        return m
+    
+    if m['ws'] is None:
+        try: m['ws'] = sh.worksheet("Projetos")
+        except: m['ws'] = sh.add_worksheet("Projetos", 100, 20)
+    ws = m['ws']
+    
+    # Uma leitura só: linha 1 (headers) + coluna A (_id)
+    topo, col_a = ws.batch_get(['1:1', 'A:A'])
+    m['headers'] = list(topo[0]) if topo else []
+    # _id repetido aponta para a primeira linha (como o ws.find de antes)
+    m['linhas'] = {}
+    for i, v in enumerate(col_a):
+        if i > 0 and v and v[0]: m['linhas'].setdefault(str(v[0]), i+1)
+    m['n_cols'] = max(m['n_cols'], ws.col_count)
+    m['lido_em'] = time.time()
+    return m
+
+def _linhas_conferidas(sh, ids):
+    """{_id: nº da linha} dos ids que existem, conferidos na coluna A antes de gravar
+    (outra pessoa/réplica pode ter apagado ou ordenado linhas desde a leitura do mapa).
+    Relê o mapa uma vez se algo mudou de lugar. Chamar com _trava_projetos."""
+    m = _carregar_mapa_projetos(sh)
+    if any(i not in m['linhas'] for i in ids): m = _carregar_mapa_projetos(sh, forcar=True)
+    for tentativa in range(2):
+        alvo = {i: m['linhas'][i] for i in ids if i in m['linhas']}
+        if not alvo: return m, alvo
+        vals = m['ws'].batch_get([f"A{linha}" for linha in alvo.values()])
+        if all(v and v[0] and str(v[0][0]) == i for i, v in zip(alvo, vals)): return m, alvo
+        if tentativa == 0: m = _carregar_mapa_projetos(sh, forcar=True)
+    raise RuntimeError("Linhas da aba Projetos mudaram de lugar durante a gravação")
+
+def _esquecer_mapa_projetos():
+    _mapa_projetos.update(ws=None, lido_em=0.0)
+
+def _celulas(valores):
+    return {'values': [{'userEnteredValue': {'stringValue': v}} for v in valores]}
+
+def _planilha():
+    sh = _conectar_gsheets()
+    if not sh: raise RuntimeError("Sem conexão com o Google Sheets")
+    return sh
+
+class BackendSheets:
+    """Lê e grava direto no DB_SIARCON. Falhas de escrita levantam exceção."""
+    
+    def ler_aba(self, nome_aba):
+        sh = _conectar_gsheets()
+        if not sh: return None
+        try:
+            try: ws = sh.worksheet(nome_aba)
+            except: 
+                try: ws = sh.add_worksheet(nome_aba, 100, 20)
+                except: return None
+            
+            data = ws.get_all_records()
+            return pd.DataFrame(data)
+        except: return None
+    
+    def ler_valores(self, nome_aba):
+        """(headers, linhas) crus da aba; None se a leitura falhar."""
+        sh = _conectar_gsheets()
+        if not sh: return None
+        try:
+            try: vals = sh.worksheet(nome_aba).get_all_values()
+            except gspread.WorksheetNotFound: return [], []
+            return (vals[0], vals[1:]) if vals else ([], [])
+        except: return None
+    
+    def ler_linhas(self, nome_aba):
+        """Linhas sem o cabeçalho; None se a leitura falhar."""
+        valores = self.ler_valores(nome_aba)
+        return valores[1] if valores is not None else None
+    
+    def ler_projeto(self, id_projeto):
+        """Linha do projeto via mapa da coluna A (1:1 + a linha, sem baixar a aba)."""
+        sh = _conectar_gsheets()
+        if not sh: return None
+        id_proj = str(id_projeto)
+        try:
+            for tentativa in range(2):
+                with _trava_projetos:
+                    m = _carregar_mapa_projetos(sh, forcar=tentativa > 0)
+                    linha, headers, ws = m['linhas'].get(id_proj), list(m['headers']), m['ws']
+                if not linha: return None
+                vals = ws.get(f"{linha}:{linha}")
+                row = list(vals[0]) if vals else []
+                # Linhas mudaram de lugar desde a leitura do mapa: relê e tenta de novo
+                if row and str(row[0]) == id_proj:
+                    row += [""] * (len(headers) - len(row))
+                    return dict(zip(headers, row))
+        except: _esquecer_mapa_projetos()
+        return None
+
+    def gravar_projeto(self, dados, novo):
+        self.gravar_projetos([dados], novo)
+    
+    def gravar_projetos(self, lista, novo):
+        sh = _planilha()
+        try:
+            with _trava_projetos:
+                ids = [str(dados['_id']) for dados in lista]
+                
+                # 1. Headers e linhas em memória; linhas a sobrescrever conferidas na coluna A
+                if novo: m, alvo = _carregar_mapa_projetos(sh), {}
+                else: m, alvo = _linhas_conferidas(sh, ids)
+                ws = m['ws']
+                
+                # 2. Chaves novas (ex: itens_tecnicos) viram colunas no fim do cabeçalho
+                headers = list(m['headers']) or list(HEADERS_PADRAO)
+                for dados in lista:
+                    headers.extend([chave for chave in dados.keys() if chave not in headers])
+                
+                requests = []
+                if len(headers) > m['n_cols']:
+                    requests.append({'appendDimension': {
+                        'sheetId': ws.id, 'dimension': 'COLUMNS', 'length': len(headers) - m['n_cols']}})
+                if headers != m['headers']:
+                    requests.append({'updateCells': {
+                        'rows': [_celulas(headers)], 'fields': 'userEnteredValue',
+                        'start': {'sheetId': ws.id, 'rowIndex': 0, 'columnIndex': 0}}})
+                
+                # 3. Linhas na ordem dos headers (tudo string, como antes)
+                novas = []
+                for id_proj, dados in zip(ids, lista):
+                    row_data = [str(dados.get(h, "")) for h in headers]
+                    linha = alvo.get(id_proj)
+                    if linha:
+                        # Atualiza linha existente
+                        requests.append({'updateCells': {
+                            'rows': [_celulas(row_data)], 'fields': 'userEnteredValue',
+                            'start': {'sheetId': ws.id, 'rowIndex': linha-1, 'columnIndex': 0}}})
+                    else: novas.append(_celulas(row_data))
+                if novas:
+                    # Cria as linhas novas depois da última com dados (o próprio Sheets acha o fim)
+                    requests.append({'appendCells': {
+                        'sheetId': ws.id, 'rows': novas, 'fields': 'userEnteredValue'}})
+                
+                # 4. Tudo numa chamada só
+                sh.batch_update({'requests': requests})
+                m['headers'] = headers
+                m['n_cols'] = max(m['n_cols'], len(headers))
+        except:
+            _esquecer_mapa_projetos()
+            raise
+    
+    def excluir_projeto(self, id_projeto):
+        sh = _planilha()
+        try:
+            with _trava_projetos:
+                m, alvo = _linhas_conferidas(sh, [str(id_projeto)])
+                linha = alvo.get(str(id_projeto))
+                if not linha: return False
+                m['ws'].delete_rows(linha)
+                # As linhas abaixo sobem uma posição
+                m['linhas'] = {k: (v-1 if v > linha else v) for k, v in m['linhas'].items() if k != str(id_projeto)}
+                return True
+        except:
+            _esquecer_mapa_projetos()
+            raise
+    
+    def gravar_status(self, ids, status):
+        sh = _planilha()
+        try:
+            with _trava_projetos:
+                if 'status' not in _carregar_mapa_projetos(sh)['headers']: _carregar_mapa_projetos(sh, forcar=True)
+                m, alvo = _linhas_conferidas(sh, [str(i) for i in ids])
+                if 'status' not in m['headers']: raise RuntimeError("Aba Projetos sem a coluna status")
+                col = m['headers'].index('status')
+                linhas = sorted(set(alvo.values()))
+                if not linhas: return 0
+                # Uma célula por projeto, todas no mesmo batch_update
+                sh.batch_update({'requests': [{'updateCells': {
+                    'rows': [_celulas([str(status)])], 'fields': 'userEnteredValue',
+                    'start': {'sheetId': m['ws'].id, 'rowIndex': linha-1, 'columnIndex': col}}} for linha in linhas]})
+                return len(linhas)
+        except:
+            _esquecer_mapa_projetos()
+            raise
+
+    def gravar_senha(self, usuario, antiga, nova):
+        """Troca a Senha da primeira linha com (usuario, antiga); False se não achar."""
+        ws = _planilha().worksheet("Usuarios")
+        vals = ws.get_all_values()
+        if not vals or 'Usuario' not in vals[0] or 'Senha' not in vals[0]: return False
+        cu, cs = vals[0].index('Usuario'), vals[0].index('Senha')
+        for i, row in enumerate(vals[1:], start=2):
+            if len(row) > max(cu, cs) and str(row[cu]) == str(usuario) and str(row[cs]) == str(antiga):
+                ws.update_cell(i, cs + 1, nova)
+                return True
+        return False
+
+    def aprender_itens(self, itens):
+        """itens = [(categoria, item), ...] -> um append_rows só."""
+        sh = _planilha()
         try: ws = sh.worksheet("Dados")
         except: ws = sh.add_worksheet("Dados", 100, 10)
         
-        if not ws.row_values(1): ws.append_row(["Categoria", "Item"])
+        linhas = [[str(c).lower(), i] for c, i in itens]
+        if not ws.row_values(1): linhas.insert(0, ["Categoria", "Item"])
         
-        ws.append_row([categoria.lower(), novo_item])
-        return True
-    except: return False
+        ws.append_rows(linhas)
+    
+    def pendentes(self): return None
+    def atualizar(self): pass
+
+# --- SQLite local -----------------------------------------------------------
+class BackendSQLite:
+    """Tudo num arquivo SQLite, sem Google (colunas TEXT, como o Sheets devolve)."""
+    
+    def __init__(self, banco):
+        self.banco = banco
+    
+    def _pendente(self, op, args):
+        return None
+    
+    def ler_aba(self, nome_aba):
+        return self.banco.ler_df(nome_aba)
+    
+    def ler_linhas(self, nome_aba):
+        return self.ler_aba(nome_aba).values.tolist()
+
+    def ler_projeto(self, id_projeto):
+        return self.banco.ler_linha("Projetos", '_id', id_projeto)
+    
+    def gravar_projeto(self, dados, novo):
+        self.gravar_projetos([dados], novo)
+    
+    def gravar_projetos(self, lista, novo):
+        # Mesma ordem de colunas que o Sheets usa ao criar a aba
+        linhas = []
+        for dados in lista:
+            ordem = HEADERS_PADRAO + [k for k in dados if k not in HEADERS_PADRAO]
+            linhas.append({k: str(dados.get(k, "")) for k in ordem})
+        self.banco.salvar_linhas("Projetos", linhas, chave=None if novo else '_id',
+                                 pendente=self._pendente('registrar_projetos', [linhas, novo]))
+    
+    def excluir_projeto(self, id_projeto):
+        return self.banco.excluir_linha("Projetos", '_id', id_projeto,
+                                        pendente=self._pendente('excluir_projeto', [str(id_projeto)]))
+    
+    def gravar_status(self, ids, status):
+        return self.banco.atualizar_coluna("Projetos", '_id', ids, 'status', status,
+                                           pendente=self._pendente('mover_status', [ids, status]))
+
+    def gravar_senha(self, usuario, antiga, nova):
+        return self.banco.atualizar_coluna("Usuarios", 'Usuario', [usuario], 'Senha', nova,
+                                           pendente=self._pendente('gravar_senha', [usuario, antiga, nova])) > 0
+
+    def aprender_itens(self, itens):
+        itens = [[str(c).lower(), i] for c, i in itens]
+        self.banco.salvar_linhas("Dados", [{"Categoria": c, "Item": i} for c, i in itens],
+                                 pendente=self._pendente('aprender_itens', [itens]))
+    
+    def pendentes(self): return None
+    def atualizar(self): pass
+
+# --- Espelho: SQLite local + Sheets em segundo plano ------------------------
+class BackendEspelho(BackendSQLite):
+    """Leituras do SQLite; cada escrita entra na fila do banco junto com a
+    alteração local e é reenviada ao Sheets (em ordem, com novas tentativas)."""
+    
+    def __init__(self, banco, remoto):
+        super().__init__(banco)
+        self.remoto = remoto
+        self.ops = {'excluir_projeto': remoto.excluir_projeto,
+                    'registrar_projetos': remoto.gravar_projetos,
+                    'mover_status': remoto.gravar_status,
+                    'aprender_itens': remoto.aprender_itens,
+                    'gravar_senha': remoto.gravar_senha}
+        banco.iniciar_sincronizacao(self._executar, remoto.ler_valores, ABAS_ESPELHO, ao_atualizar=invalidar_aba)
+    
+    def _executar(self, op, args):
+        if op not in self.ops: raise ValueError(f"Operação desconhecida na fila: {op}")
+        self.ops[op](*args)
+    
+    def _pendente(self, op, args):
+        return (op, args)
+    
+    def _garantir(self, nome_aba):
+        # Primeira leitura da aba popula o SQLite
+        if not self.banco.carregada(nome_aba):
+            remoto = self.remoto.ler_valores(nome_aba)
+            if remoto is None: raise RuntimeError(f"Sem conexão com o Google Sheets ({nome_aba})")
+            self.banco.substituir_aba(nome_aba, *remoto)
+    
+    def ler_aba(self, nome_aba):
+        self._garantir(nome_aba)
+        return super().ler_aba(nome_aba)
+
+    def ler_projeto(self, id_projeto):
+        self._garantir("Projetos")
+        return super().ler_projeto(id_projeto)
+    
+    def gravar_projetos(self, lista, novo):
+        self._garantir("Projetos")
+        super().gravar_projetos(lista, novo)
+    
+    def excluir_projeto(self, id_projeto):
+        self._garantir("Projetos")
+        return super().excluir_projeto(id_projeto)
+    
+    def gravar_status(self, ids, status):
+        self._garantir("Projetos")
+        return super().gravar_status(ids, status)
+
+    def gravar_senha(self, usuario, antiga, nova):
+        self._garantir("Usuarios")
+        return super().gravar_senha(usuario, antiga, nova)
+
+    def aprender_itens(self, itens):
+        self._garantir("Dados")
+        super().aprender_itens(itens)
+    
+    def pendentes(self): return self.banco.pendentes()
+    def atualizar(self): self.banco.pedir_atualizacao()
@@ -0,0 +1,534 @@
+import os
+import re
+import sys
+import math
+import json
+import time
+import hashlib
+import tempfile
+import tracemalloc
+from array import array
+from contextlib import contextmanager
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing as mp
+import numpy as np
+import pandas as pd
+from ezdxf import recover
+from ezdxf.addons import iterdxf
+
+try: import resource
+except ImportError: resource = None  # Windows
+
+# ============================================================================
+# 1. CARREGAMENTO E TEXTO
+# ============================================================================
+# Tipos que o leitor usa; ATTRIB/SEQEND vêm junto para montar os atributos dos INSERT
+TIPOS_LEITURA = ['TEXT', 'MTEXT', 'INSERT', 'ATTRIB', 'SEQEND', 'LINE', 'LWPOLYLINE']
+
+def carregar_dxf_seguro(uploaded_file):
+    # Leitura completa com recover, direto do buffer do upload (sem arquivo temporário)
+    try:
+        uploaded_file.seek(0)
+        doc, auditor = recover.read(uploaded_file)
+        return doc, None
+    except Exception as e:
+        return None, str(e)
+
+class _FluxoComSentinela:
+    """readline() do upload com uma entidade POINT extra antes do ENDSEC das ENTITIES."""
+    # O single_pass_modelspace do ezdxf descarta a última entidade da seção;
+    # a sentinela ocupa esse lugar e não está em TIPOS_LEITURA.
+    def __init__(self, arquivo):
+        self.arquivo = arquivo
+        self.pendentes = []
+        self.em_entities = False
+    
+    def readline(self):
+        if self.pendentes: return self.pendentes.pop()
+        code = self.arquivo.readline()
+        value = self.arquivo.readline()
+        cod, val = code.strip(), value.strip()
+        if cod == b'2' and val == b'ENTITIES':
+            self.em_entities = True
+        elif self.em_entities and cod == b'0' and val == b'ENDSEC':
+            self.em_entities = False
+            self.pendentes = [value, code, b'POINT\n']
+            return code
+        self.pendentes = [value]
+        return code
+
+def ler_dxf_stream(uploaded_file):
+    """Uma passada pelo buffer: só as entidades do modelspace que o leitor usa viram objetos."""
+    # Paperspace e blocos são pulados; textos viram registros e linhas vão direto para a tabela
+    textos, attribs = [], []
+    def geometria():
+        for e in iterdxf.single_pass_modelspace(_FluxoComSentinela(uploaded_file), types=TIPOS_LEITURA):
+            if e.dxftype() in ('LINE', 'LWPOLYLINE'): yield e
+            else: _coletar_textos(e, textos, attribs)
+    
+    uploaded_file.seek(0)
+    tab = extrair_segmentos(geometria())
+    return textos + attribs, tab
+
+def carregar_dxf(uploaded_file, perfil=None):
+    """Retorna (textos, tabela de segmentos, erro): fluxo rápido e, se falhar, recover completo."""
+    try:
+        with etapa(perfil, "leitura + extração (stream)") as reg:
+            textos, tab = ler_dxf_stream(uploaded_file)
+            reg.update(textos=len(textos), segmentos=int(len(tab['len'])))
+        if textos or len(tab['len']): return textos, tab, None
+    except Exception: pass
+    
+    with etapa(perfil, "leitura (recover)"):
+        doc, err = carregar_dxf_seguro(uploaded_file)
+    if err: return None, None, err
+    msp = doc.modelspace()
+    with etapa(perfil, "extração de textos") as reg:
+        textos = extrair_todos_textos(msp.query('TEXT MTEXT INSERT'))
+        reg['textos'] = len(textos)
+    with etapa(perfil, "extração de segmentos") as reg:
+        tab = extrair_segmentos(msp.query('LINE LWPOLYLINE'))
+        reg['segmentos'] = int(len(tab['len']))
+    return textos, tab, None
+
+def _registro_texto(e, txt):
+    ins = e.dxf.insert
+    return {'texto': txt, 'x': ins.x, 'y': ins.y}
+
+def _coletar_textos(e, textos, attribs):
+    tipo = e.dxftype()
+    if tipo in ('TEXT', 'MTEXT'):
+        txt = e.dxf.text if tipo == 'TEXT' else e.text
+        if txt: textos.append(_registro_texto(e, txt))
+    elif tipo == 'INSERT' and e.attribs:
+        for a in e.attribs:
+            t = a.dxf.text
+            if t: attribs.append(_registro_texto(a, t))
+
+def extrair_todos_textos(entidades):
+    # TEXT/MTEXT primeiro e depois os atributos dos blocos
+    textos, attribs = [], []
+    for e in entidades: _coletar_textos(e, textos, attribs)
+    return textos + attribs
+
+# Padrões compilados uma vez por processo
+RE_FORMATO_MTEXT = re.compile(r'\\[ACFHQTW].*?;')
+RE_QUEBRA_MTEXT = re.compile(r'\\P|\\N')
+RE_DIMENSAO = re.compile(r'([\d\.]+)\s*[xX*]\s*([\d\.]+)')
+SEM_CHAVES = str.maketrans('', '', '{}')
+
+@lru_cache(maxsize=32)
+def _compilar_blacklist(termos):
+    # Uma alternação só: um search por texto em vez de um "in" por termo
+    termos = [t.strip() for t in termos if t.strip()]
+    return re.compile('|'.join(map(re.escape, termos))) if termos else None
+
+def _valor_dim(s):
+    # "1.200" (milhar) vira 1200; "12.5" continua decimal
+    return float(s.replace('.','')) if '.' in s and len(s)>4 else float(s)
+
+def limpar_parsear(txt_raw, lista_negativa, usar_filtro_vazao):
+    t = RE_FORMATO_MTEXT.sub('', txt_raw)
+    t = RE_QUEBRA_MTEXT.sub(' ', t)
+    t = t.translate(SEM_CHAVES).strip().upper()
+    
+    blacklist = _compilar_blacklist(tuple(lista_negativa))
+    if blacklist and blacklist.search(t):
+        return None, None, t
+
+    if usar_filtro_vazao:
+        if "(" not in t or ")" not in t:
+            return None, None, t
+
+    m = RE_DIMENSAO.search(t)
+    if m:
+        try:
+            l_val = _valor_dim(m.group(1))
+            a_val = _valor_dim(m.group(2))
+            if l_val > 50 and a_val > 50:
+                return l_val, a_val, t
+        except: pass
+    return None, None, t
+
+def parsear_lote(textos, lista_negativa, usar_filtro_vazao):
+    """limpar_parsear para a lista inteira; textos repetidos (tags iguais) são parseados uma vez."""
+    memo = {}
+    res = []
+    for txt in textos:
+        r = memo.get(txt)
+        if r is None:
+            r = memo[txt] = limpar_parsear(txt, lista_negativa, usar_filtro_vazao)
+        res.append(r)
+    return res
+
+# ============================================================================
+# 2. MOTOR GEOMÉTRICO
+# ============================================================================
+def extrair_segmentos(entidades):
+    """Tabela colunar (NumPy) com todos os segmentos das entidades LINE/LWPOLYLINE."""
+    # Colunas em array() durante a leitura: nenhum objeto Python por segmento.
+    # px/py = 1º ponto da entidade (critério do raio); a ordem das linhas é a do desenho.
+    x1, y1, x2, y2 = array('d'), array('d'), array('d'), array('d')
+    px, py = array('d'), array('d')
+    layer = array('i')
+    ids_layer = {}
+    for e in entidades:
+        try:
+            if e.dxftype() == 'LINE':
+                pts = [(e.dxf.start.x, e.dxf.start.y), (e.dxf.end.x, e.dxf.end.y)]
+            else:
+                pts = e.get_points('xy')
+            lid = ids_layer.setdefault(e.dxf.layer, len(ids_layer))
+            ex, ey = pts[0][0], pts[0][1]
+            for i in range(len(pts)-1):
+                x1.append(pts[i][0]); y1.append(pts[i][1])
+                x2.append(pts[i+1][0]); y2.append(pts[i+1][1])
+                px.append(ex); py.append(ey); layer.append(lid)
+        except: pass
+    
+    tab = {k: np.frombuffer(v, dtype=np.float64) for k, v in
+           [('x1', x1), ('y1', y1), ('x2', x2), ('y2', y2), ('px', px), ('py', py)]}
+    tab['layer'] = np.frombuffer(layer, dtype=np.int32)
+    dx, dy = tab['x2'] - tab['x1'], tab['y2'] - tab['y1']
+    tab['len'] = np.hypot(dx, dy)
+    tab['ang'] = np.degrees(np.arctan2(dy, dx)) % 180
+    ok = tab['len'] > 0
+    if not ok.all(): tab = {k: v[ok] for k, v in tab.items()}
+    tab['layers'] = list(ids_layer)
+    return tab
+
+def construir_indice(tab, layers, tam_celula):
+    """Grade uniforme dos segmentos de parede, montada uma vez por desenho."""
+    # Cada segmento entra na célula do 1º ponto da sua entidade (mesmo critério do raio);
+    # dentro da célula os índices ficam em ordem crescente = ordem original do desenho.
+    tam = tam_celula if tam_celula > 0 else 1.0
+    if layers:
+        ids = [i for i, nome in enumerate(tab['layers']) if nome in layers]
+        idx = np.flatnonzero(np.isin(tab['layer'], ids))
+    else:
+        idx = np.arange(len(tab['len']))
+    
+    celulas = {}
+    if len(idx):
+        cx = np.floor(tab['px'][idx] / tam).astype(np.int64)
+        cy = np.floor(tab['py'][idx] / tam).astype(np.int64)
+        ordem = np.lexsort((idx, cy, cx))
+        idx, cx, cy = idx[ordem], cx[ordem], cy[ordem]
+        quebras = np.flatnonzero((np.diff(cx) != 0) | (np.diff(cy) != 0)) + 1
+        for ini, fim in zip(np.r_[0, quebras], np.r_[quebras, len(idx)]):
+            celulas[(int(cx[ini]), int(cy[ini]))] = idx[ini:fim]
+    return {'tam': tam, 'celulas': celulas, 'tab': tab}
+
+def consultar_indice(indice, tx, ty, raio):
+    """Índices dos segmentos cujas entidades começam no quadrado de lado 2*raio."""
+    tam = indice['tam']
+    celulas = indice['celulas']
+    partes = []
+    for cx in range(math.floor((tx-raio)/tam), math.floor((tx+raio)/tam)+1):
+        for cy in range(math.floor((ty-raio)/tam), math.floor((ty+raio)/tam)+1):
+            if (cx, cy) in celulas: partes.append(celulas[(cx, cy)])
+    if not partes: return np.empty(0, dtype=np.int64)
+    
+    idx = np.concatenate(partes)
+    tab = indice['tab']
+    dentro = (np.abs(tab['px'][idx] - tx) <= raio) & (np.abs(tab['py'][idx] - ty) <= raio)
+    return np.sort(idx[dentro])
+
+# Escalas testadas (desenho em mm, cm, m...) e fator para converter o comprimento em metros
+ESCALAS = np.array([1.0, 0.1, 0.01, 0.001])
+F_METRO = np.array([0.001, 0.01, 1.0, 1.0])
+ELEMENTOS_BLOCO = 1 << 18
+
+def parear_segmentos(seg, w_target, h_target):
+    """Casa as paredes paralelas em lote (arrays x1, y1, x2, y2, len, ang)."""
+    x1, y1, x2, y2, comp, ang = seg
+    n = len(x1)
+    mx, my = (x1+x2)/2, (y1+y2)/2
+    A = y1-y2; B = x2-x1; C = x1*y2 - x2*y1
+    denom = np.hypot(A, B)
+    w_t = w_target * ESCALAS
+    h_t = h_target * ESCALAS
+    tol_w, tol_h = w_t * 0.05, h_t * 0.05
+    
+    melhor_comp = 0.0
+    match_info = "Não medido"
+    j = np.arange(n)
+    passo = max(1, ELEMENTOS_BLOCO // n)
+    
+    # Blocos de linhas i contra todos os j > i: mesma ordem (i, j, escala) do laço antigo
+    for ini in range(0, n-1, passo):
+        i = np.arange(ini, min(ini+passo, n-1))
+        d_ang = np.abs(ang[i, None] - ang[None, :])
+        valido = (j[None, :] > i[:, None]) & ((d_ang <= 5) | (d_ang >= 175))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            dist = np.abs(A[None, :]*mx[i, None] + B[None, :]*my[i, None] + C[None, :]) / denom[None, :]
+        valido &= dist >= 0.001
+        
+        d = dist[..., None]
+        casa = ((np.abs(d - w_t) < tol_w) | (np.abs(d - h_t) < tol_h)) & valido[..., None]
+        comp_cad = (comp[i, None] + comp[None, :]) / 2
+        comp_real = np.where(casa, comp_cad[..., None] * F_METRO, 0.0)
+        
+        k = int(np.argmax(comp_real))
+        if comp_real.flat[k] > melhor_comp:
+            melhor_comp = float(comp_real.flat[k])
+            match_info = f"Medido (Esc {float(ESCALAS[k % len(ESCALAS)])})"
+    
+    return melhor_comp, match_info
+
+def medir_duto_geom(indice, tx, ty, w_target, h_target, raio):
+    # Retorna (comprimento em m, status, nº de segmentos candidatos)
+    idx = consultar_indice(indice, tx, ty, raio)
+    if len(idx) < 2: return 0.0, "Sem linhas", len(idx)
+    
+    tab = indice['tab']
+    seg = tuple(tab[k][idx] for k in ('x1', 'y1', 'x2', 'y2', 'len', 'ang'))
+    return (*parear_segmentos(seg, w_target, h_target), len(idx))
+
+# ============================================================================
+# 3. MEDIÇÃO PARALELA
+# ============================================================================
+# Abaixo disso o custo de subir os processos (spawn, ~1-2 s) não compensa
+MIN_TAREFAS_PARALELO = 2000
+BLOCOS_POR_PROCESSO = 4
+# Cada processo recebe uma cópia da tabela de segmentos: acima disso o ganho some
+MAX_PROCESSOS_PADRAO = 4
+
+def nucleos_disponiveis():
+    """Núcleos que este processo pode usar (respeita taskset/cgroup), não os da máquina."""
+    try: return len(os.sched_getaffinity(0))
+    except: return os.cpu_count() or 1
+
+_indice_worker = None
+
+def _iniciar_worker(tab, layers, raio):
+    # Roda uma vez por processo: a tabela de segmentos chega aqui uma única vez
+    global _indice_worker
+    _indice_worker = construir_indice(tab, layers, raio)
+
+def _medir_bloco(args):
+    tarefas, raio = args
+    return [medir_duto_geom(_indice_worker, tx, ty, w, h, raio) for tx, ty, w, h in tarefas]
+
+def medir_lote(tab, layers, raio, tarefas, n_processos=1):
+    """Mede uma lista de (tx, ty, largura, altura), devolvendo os resultados na mesma ordem."""
+    if n_processos <= 1 or len(tarefas) < MIN_TAREFAS_PARALELO:
+        indice = construir_indice(tab, layers, raio)
+        return [medir_duto_geom(indice, tx, ty, w, h, raio) for tx, ty, w, h in tarefas]
+    
+    # Blocos contíguos; o map devolve na ordem de entrada, então a junção é determinística
+    n_blocos = n_processos * BLOCOS_POR_PROCESSO
+    passo = -(-len(tarefas) // n_blocos)
+    blocos = [(tarefas[i:i+passo], raio) for i in range(0, len(tarefas), passo)]
+    
+    # spawn: o servidor do Streamlit tem várias threads, fork não é seguro
+    with ProcessPoolExecutor(max_workers=n_processos, mp_context=mp.get_context('spawn'),
+                             initializer=_iniciar_worker, initargs=(tab, layers, raio)) as ex:
+        return [r for bloco in ex.map(_medir_bloco, blocos) for r in bloco]
+
+# ============================================================================
+# 4. PROCESSAMENTO
+# ============================================================================
+def processar(lista, tab, layers_duto, raio, padrao, blacklist_str, usar_vazao, n_processos=1, perfil=None):
+    dutos = []
+    restos = []
+    logs = []
+    
+    blacklist = [x.strip().upper() for x in blacklist_str.split(',') if x.strip()]
+    
+    # 1ª passada: classifica os textos; os dutos ficam na fila de medição
+    itens = []
+    tarefas = []
+    with etapa(perfil, "parser de tags") as reg:
+        parseados = parsear_lote([item['texto'] for item in lista], blacklist, usar_vazao)
+        reg['textos'] = len(lista)
+    for item, (l, a, t) in zip(lista, parseados):
+        if l:
+            # Filtro Grelha (Final 25 ou AWG)
+            eh_grelha = str(int(l)).endswith('25') or str(int(a)).endswith('25') or "AWG" in t
+            
+            if eh_grelha:
+                itens.append(('grelha', t, l, a))
+            else:
+                tarefas.append((item['x'], item['y'], l, a))
+                itens.append(('duto', t, l, a))
+        else:
+            if t and any(c.isalpha() for c in t):
+                itens.append(('resto', t, l, a))
+    
+    with etapa(perfil, "geometria (match)") as reg:
+        medidas = medir_lote(tab, layers_duto, raio, tarefas, n_processos)
+        reg.update(tags=len(tarefas), segmentos=int(len(tab['len'])))
+    if perfil is not None: perfil['candidatos'] = [m[2] for m in medidas]
+    medidas = iter(medidas)
+    
+    # 2ª passada: monta as saídas na ordem original dos textos
+    for tipo, t, l, a in itens:
+        if tipo == 'grelha':
+            restos.append(t)
+            logs.append(f"💨 Grelha detectada: {t}")
+        elif tipo == 'duto':
+            comp_m, status, _ = next(medidas)
+            val_final = comp_m if comp_m > 0 else padrao
+            orig = "Medido (Auto)" if comp_m > 0 else "Estimado (Padrão)"
+            
+            dutos.append({
+                "Largura": l, "Altura": a, "Comp. (m)": val_final,
+                "Origem": orig, "Tag": t
+            })
+            logs.append(f"✅ Duto: {t} -> {val_final:.2f}m ({status})")
+        else:
+            restos.append(t)
+                
+    return dutos, restos, logs
+
+# ============================================================================
+# 5. PERFIL DE ETAPAS (DIAGNÓSTICO)
+# ============================================================================
+FAIXAS_CANDIDATOS = [(0, 1, "0-1"), (2, 10, "2-10"), (11, 50, "11-50"), (51, 200, "51-200"),
+                     (201, 1000, "201-1000"), (1001, math.inf, ">1000")]
+
+def novo_perfil(medir_memoria=False):
+    return {'etapas': [], 'candidatos': [], 'memoria': medir_memoria}
+
+@contextmanager
+def etapa(perfil, nome):
+    """Cronometra um bloco e registra no perfil; o dict devolvido recebe as contagens.
+    pico_mb: pico do tracemalloc acima do que já estava alocado na entrada (etapas
+    aninhadas também medem; a de fora continua vendo o pico das de dentro).
+    rss_cresc_mb: quanto a etapa subiu o pico de RSS do processo (0 = não passou do
+    pico anterior); rss_pico_proc_mb: pico do processo até o fim da etapa."""
+    reg = {'etapa': nome}
+    if perfil is None:
+        yield reg
+        return
+    # tracemalloc só quando pedido: deixa as etapas em Python bem mais lentas
+    rastrear = perfil['memoria']
+    aninhada = rastrear and tracemalloc.is_tracing()
+    if aninhada:
+        # reset_peak apaga o pico da etapa de fora: guarda para ela somar na saída
+        perfil['_pico_tracemalloc'] = max(perfil.get('_pico_tracemalloc', 0), tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+    elif rastrear:
+        perfil['_pico_tracemalloc'] = 0
+        tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0] if rastrear else 0
+    rss0 = _rss_max_mb()
+    t0 = time.perf_counter()
+    try:
+        yield reg
+    finally:
+        reg['tempo_s'] = round(time.perf_counter() - t0, 4)
+        if rastrear:
+            pico = tracemalloc.get_traced_memory()[1]
+            if not aninhada:
+                pico = max(pico, perfil.pop('_pico_tracemalloc', 0))
+                tracemalloc.stop()
+            reg['pico_mb'] = round((pico - base) / 1e6, 1)
+        rss1 = _rss_max_mb()
+        reg['rss_cresc_mb'] = round(rss1 - rss0, 1) if rss1 is not None else None
+        reg['rss_pico_proc_mb'] = rss1
+        # Etapas que rodam a cada rerun (memorial, Excel) substituem o registro anterior
+        perfil['etapas'] = [e for e in perfil['etapas'] if e['etapa'] != nome] + [reg]
+
+def _rss_max_mb():
+    # Pico de RSS do processo inteiro desde o início (Linux em KB, macOS em bytes)
+    if resource is None: return None
+    r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(r / 1e6 if sys.platform == 'darwin' else r / 1024, 1)
+
+def histograma_candidatos(candidatos):
+    c = np.asarray(candidatos)
+    return {rot: int(((c >= ini) & (c <= fim)).sum()) for ini, fim, rot in FAIXAS_CANDIDATOS}
+
+# ============================================================================
+# 6. MEMORIAL (ABNT 16401)
+# ============================================================================
+# Maior lado (mm) até o limite -> bitola (MSG) e peso da chapa (kg/m²)
+TABELA_BITOLAS = {
+    "Classe A": [(300, 26, 4.2), (750, 24, 5.4), (1500, 22, 6.8), (2100, 20, 8.6), (math.inf, 18, 11.0)],
+    "Classe B": [(750, 24, 5.4), (1500, 22, 6.8), (2100, 20, 8.6), (math.inf, 18, 11.0)],
+    "Classe C": [(1000, 22, 6.8), (2100, 20, 8.6), (math.inf, 18, 11.0)],
+}
+
+def faixas_bitola(classe_pressao):
+    for classe in ("Classe A", "Classe B"):
+        if classe in classe_pressao: return TABELA_BITOLAS[classe]
+    return TABELA_BITOLAS["Classe C"]
+
+def calcular_memorial(df_dutos, classe_pressao, perda_corte):
+    """Memorial de chapa por trecho, calculado em colunas sobre o DataFrame de dutos."""
+    limites, bitolas, pesos = (np.array(c) for c in zip(*faixas_bitola(classe_pressao)))
+    rotulos = np.array([f"#{b}" for b in bitolas], dtype=object)
+    
+    larg = df_dutos['Largura'].to_numpy(dtype=float)
+    alt = df_dutos['Altura'].to_numpy(dtype=float)
+    comp = df_dutos['Comp. (m)'].to_numpy(dtype=float)
+    
+    # searchsorted à esquerda = primeira faixa com limite >= maior lado
+    k = np.searchsorted(limites, np.maximum(larg, alt), side='left')
+    perimetro = (2*larg + 2*alt) / 1000
+    area_trecho = perimetro * comp * (1 + perda_corte/100)
+    
+    return pd.DataFrame({
+        "Tag": df_dutos['Tag'].to_numpy(), "Largura (mm)": larg, "Altura (mm)": alt,
+        "Comprimento (m)": comp, "Bitola (MSG)": rotulos[k],
+        "Área (m²)": area_trecho, "Peso (kg)": area_trecho * pesos[k], "Origem": df_dutos['Origem'].to_numpy()
+    })
+
+# ============================================================================
+# 7. CACHE DE RESULTADOS (DISCO, LRU)
+# ============================================================================
+PASTA_CACHE = os.path.join(tempfile.gettempdir(), "siarcon_dxf_cache")
+LIMITE_CACHE_MB = 200
+
+def hash_arquivo(dados):
+    return hashlib.sha256(dados).hexdigest()
+
+def _chave(*partes):
+    return hashlib.sha256(json.dumps(partes, sort_keys=True).encode()).hexdigest()
+
+def chave_layers(hash_dxf):
+    return _chave(hash_dxf, 'layers')
+
+def chave_resultado(hash_dxf, layers_duto, raio, padrao, blacklist_str, usar_vazao):
+    # Mesma normalização do processar: parâmetros equivalentes caem na mesma chave
+    blacklist = [x.strip().upper() for x in blacklist_str.split(',') if x.strip()]
+    return _chave(hash_dxf, sorted(layers_duto or []), float(raio), float(padrao), blacklist, bool(usar_vazao))
+
+def ler_cache(chave):
+    path = os.path.join(PASTA_CACHE, f"{chave}.json")
+    try:
+        with open(path, encoding='utf-8') as f: valor = json.load(f)
+        os.utime(path)  # marca como usado recentemente (LRU pelo mtime)
+        return valor
+    except: return None
+
+def gravar_cache(chave, valor):
+    try:
+        os.makedirs(PASTA_CACHE, exist_ok=True)
+        path = os.path.join(PASTA_CACHE, f"{chave}.json")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f: json.dump(valor, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        _podar_cache()
+    except: pass
+
+def _podar_cache(limite_mb=None):
+    arquivos = []
+    for nome in os.listdir(PASTA_CACHE):
+        if not nome.endswith('.json'): continue
+        try:
+            st_arq = os.stat(os.path.join(PASTA_CACHE, nome))
+            arquivos.append((st_arq.st_mtime, st_arq.st_size, nome))
+        except: pass
+    
+    total = sum(a[1] for a in arquivos)
+    limite = (limite_mb or LIMITE_CACHE_MB) * 1024 * 1024
+    for _, tam, nome in sorted(arquivos):
+        if total <= limite: break
+        try:
+            os.remove(os.path.join(PASTA_CACHE, nome))
+            total -= tam
+        except: pass
@@ -0,0 +1,230 @@
+import sqlite3
+import threading
+import time
+import json
+import pandas as pd
+
+# ==================================================
+# 1. ESQUEMA
+# ==================================================
+# Cada aba do DB_SIARCON vira uma tabela com colunas TEXT (a ordem das linhas
+# é o rowid). Colunas novas entram com ALTER TABLE, como no Sheets.
+INDICES = {
+    "Projetos": ["_id", "status", "disciplina"],
+    "Dados": ["Categoria"],
+}
+
+# Fila de sincronização: espera máx. entre tentativas e intervalo da releitura completa
+ESPERA_MAX_S = 300
+INTERVALO_PUXAR_S = 300
+
+def _q(nome):
+    return '"' + str(nome).replace('"', '""') + '"'
+
+def _nomes_colunas(headers):
+    """Cabeçalho do Sheets -> nomes únicos e não vazios."""
+    cols = []
+    for i, h in enumerate(headers):
+        nome = str(h).strip() or f"coluna_{i+1}"
+        base, n = nome, 2
+        while nome in cols: nome, n = f"{base}_{n}", n + 1
+        cols.append(nome)
+    return cols
+
+# ==================================================
+# 2. BANCO LOCAL
+# ==================================================
+class BancoSQLite:
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.trava = threading.RLock()
+        self.con = sqlite3.connect(caminho, check_same_thread=False, isolation_level=None)
+        self.con.execute("PRAGMA journal_mode=WAL")
+        self.con.execute("PRAGMA synchronous=NORMAL")
+        self.con.execute("CREATE TABLE IF NOT EXISTS _abas (aba TEXT PRIMARY KEY, carregada_em REAL)")
+        self.con.execute("""CREATE TABLE IF NOT EXISTS _fila (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, op TEXT, args TEXT,
+            tentativas INTEGER DEFAULT 0, proxima REAL DEFAULT 0, erro TEXT)""")
+        self.versao = 0   # sobe a cada escrita local (releitura do Sheets não pode atropelar)
+        self._acordar = threading.Event()
+        self._thread = None
+        self._puxado_em = time.time()
+
+    # --- Leitura -----------------------------------------------------------
+    def colunas(self, aba):
+        with self.trava:
+            return [r[1] for r in self.con.execute(f"PRAGMA table_info({_q(aba)})")]
+
+    def carregada(self, aba):
+        with self.trava:
+            return self.con.execute("SELECT 1 FROM _abas WHERE aba = ?", (aba,)).fetchone() is not None
+
+    def ler_df(self, aba):
+        with self.trava:
+            if not self.colunas(aba): return pd.DataFrame()
+            return pd.read_sql_query(f"SELECT * FROM {_q(aba)} ORDER BY rowid", self.con)
+
+    def ler_linha(self, aba, chave, valor):
+        """Primeira linha com chave == valor (usa o índice da coluna), como dict."""
+        with self.trava:
+            if chave not in self.colunas(aba): return None
+            cur = self.con.execute(f"SELECT * FROM {_q(aba)} WHERE {_q(chave)} = ? ORDER BY rowid LIMIT 1", (str(valor),))
+            row = cur.fetchone()
+            return dict(zip([d[0] for d in cur.description], row)) if row else None
+
+    # --- Escrita -----------------------------------------------------------
+    def _garantir_colunas(self, aba, cols):
+        existentes = self.colunas(aba)
+        if not existentes:
+            defs = ", ".join(f"{_q(c)} TEXT DEFAULT ''" for c in cols)
+            self.con.execute(f"CREATE TABLE {_q(aba)} ({defs})")
+            existentes = list(cols)
+        else:
+            for c in cols:
+                if c not in existentes:
+                    self.con.execute(f"ALTER TABLE {_q(aba)} ADD COLUMN {_q(c)} TEXT DEFAULT ''")
+                    existentes.append(c)
+        for c in INDICES.get(aba, []):
+            if c in existentes:
+                self.con.execute(f"CREATE INDEX IF NOT EXISTS {_q('ix_' + aba + '_' + c)} ON {_q(aba)} ({_q(c)})")
+        return existentes
+
+    def _enfileirar(self, pendente):
+        if pendente:
+            op, args = pendente
+            self.con.execute("INSERT INTO _fila (op, args) VALUES (?, ?)", (op, json.dumps(args, ensure_ascii=False, default=str)))
+
+    def substituir_aba(self, aba, headers, linhas):
+        """Troca o conteúdo da aba pelo que veio do Sheets (headers + linhas de get_all_values)."""
+        cols = _nomes_colunas(headers)
+        with self.trava:
+            self.con.execute("BEGIN")
+            try:
+                self.con.execute(f"DROP TABLE IF EXISTS {_q(aba)}")
+                if cols:
+                    self._garantir_colunas(aba, cols)
+                    n = len(cols)
+                    vals = [[str(v) for v in (list(l) + [""] * n)[:n]] for l in linhas if any(str(v).strip() for v in l)]
+                    self.con.executemany(f"INSERT INTO {_q(aba)} VALUES ({', '.join('?' * n)})", vals)
+                self.con.execute("INSERT OR REPLACE INTO _abas VALUES (?, ?)", (aba, time.time()))
+                self.con.execute("COMMIT")
+            except:
+                self.con.execute("ROLLBACK"); raise
+
+    def salvar_linhas(self, aba, lista, chave=None, pendente=None):
+        """Sem chave (ou chave ainda inexistente) insere no fim; com chave atualiza a linha
+        inteira, como o Sheets faz (colunas ausentes em dados ficam vazias). Uma transação só."""
+        with self.trava:
+            self.con.execute("BEGIN")
+            try:
+                chaves = list(dict.fromkeys(k for dados in lista for k in dados))
+                cols = self._garantir_colunas(aba, chaves)
+                sets = ", ".join(f"{_q(c)} = ?" for c in cols)
+                for dados in lista:
+                    vals = [str(dados.get(c, "")) for c in cols]
+                    cur = None
+                    if chave:
+                        cur = self.con.execute(f"UPDATE {_q(aba)} SET {sets} WHERE rowid = (SELECT MIN(rowid) FROM {_q(aba)} WHERE {_q(chave)} = ?)",
+                                               vals + [str(dados.get(chave, ""))])
+                    if cur is None or cur.rowcount == 0:
+                        self.con.execute(f"INSERT INTO {_q(aba)} ({', '.join(_q(c) for c in cols)}) VALUES ({', '.join('?' * len(cols))})", vals)
+                self._enfileirar(pendente)
+                self.versao += 1
+                self.con.execute("COMMIT")
+            except:
+                self.con.execute("ROLLBACK"); raise
+        self._acordar.set()
+
+    def atualizar_coluna(self, aba, chave, valores, coluna, valor, pendente=None):
+        """coluna = valor na primeira linha de cada chave em valores; retorna quantas mudaram."""
+        valores = [str(v) for v in valores]
+        if not valores: return 0
+        with self.trava:
+            self.con.execute("BEGIN")
+            try:
+                self._garantir_colunas(aba, [chave, coluna])
+                marcas = ", ".join("?" * len(valores))
+                cur = self.con.execute(f"UPDATE {_q(aba)} SET {_q(coluna)} = ? WHERE rowid IN "
+                                       f"(SELECT MIN(rowid) FROM {_q(aba)} WHERE {_q(chave)} IN ({marcas}) GROUP BY {_q(chave)})",
+                                       [str(valor)] + valores)
+                if cur.rowcount: self._enfileirar(pendente)
+                self.versao += 1
+                self.con.execute("COMMIT")
+            except:
+                self.con.execute("ROLLBACK"); raise
+        self._acordar.set()
+        return cur.rowcount
+
+    def excluir_linha(self, aba, chave, valor, pendente=None):
+        with self.trava:
+            if chave not in self.colunas(aba): return False
+            self.con.execute("BEGIN")
+            try:
+                cur = self.con.execute(f"DELETE FROM {_q(aba)} WHERE rowid = (SELECT MIN(rowid) FROM {_q(aba)} WHERE {_q(chave)} = ?)", (str(valor),))
+                if cur.rowcount: self._enfileirar(pendente)
+                self.versao += 1
+                self.con.execute("COMMIT")
+            except:
+                self.con.execute("ROLLBACK"); raise
+        self._acordar.set()
+        return cur.rowcount > 0
+
+    # --- Sincronização com o Sheets ----------------------------------------
+    def pendentes(self):
+        with self.trava:
+            return self.con.execute("SELECT COUNT(*) FROM _fila").fetchone()[0]
+
+    def iniciar_sincronizacao(self, executar, ler_remoto, abas, ao_atualizar=None):
+        """executar(op, args) grava no Sheets (levanta exceção se falhar);
+        ler_remoto(aba) -> (headers, linhas) ou None; ao_atualizar(aba) após cada releitura."""
+        self._executar, self._ler_remoto, self._abas = executar, ler_remoto, list(abas)
+        self._ao_atualizar = ao_atualizar
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._laco, name="sync-sqlite", daemon=True)
+            self._thread.start()
+
+    def pedir_atualizacao(self):
+        self._puxado_em = 0.0
+        self._acordar.set()
+
+    def _laco(self):
+        while True:
+            self._acordar.wait(timeout=5)
+            self._acordar.clear()
+            try:
+                if self.sincronizar_fila() and time.time() - self._puxado_em > INTERVALO_PUXAR_S:
+                    self.puxar()
+            except Exception as e:
+                print(f"Erro Sincronização SQLite: {e}")
+
+    def sincronizar_fila(self):
+        """Envia as pendências em ordem; para na primeira falha (mantém a ordem das escritas).
+        Retorna True se a fila ficou vazia."""
+        while True:
+            with self.trava:
+                item = self.con.execute("SELECT id, op, args, tentativas, proxima FROM _fila ORDER BY id LIMIT 1").fetchone()
+            if item is None: return True
+            id_fila, op, args, tentativas, proxima = item
+            if proxima > time.time(): return False
+            try:
+                self._executar(op, json.loads(args))
+                with self.trava: self.con.execute("DELETE FROM _fila WHERE id = ?", (id_fila,))
+            except Exception as e:
+                espera = min(2 ** tentativas, ESPERA_MAX_S)
+                with self.trava:
+                    self.con.execute("UPDATE _fila SET tentativas = tentativas + 1, proxima = ?, erro = ? WHERE id = ?",
+                                     (time.time() + espera, str(e)[:500], id_fila))
+                print(f"Sincronização adiada ({op}, tentativa {tentativas+1}): {e}")
+                return False
+
+    def puxar(self):
+        """Relê as abas do Sheets; só aplica se não houve escrita local no meio do caminho."""
+        self._puxado_em = time.time()
+        for aba in self._abas:
+            versao = self.versao
+            remoto = self._ler_remoto(aba)
+            if remoto is None: continue
+            with self.trava:
+                if versao != self.versao or self.pendentes(): return
+                self.substituir_aba(aba, *remoto)
+            if self._ao_atualizar: self._ao_atualizar(aba)